@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2014 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2026-10-17
+#
+
+"""allchars.py [<count> [<before> [<after>]]]
+
+Time `MATCH_ALLCHARS` searches with the linear subsequence scan against
+the regex search before that change: first on adversarial keys whose
+characters are all present but out of order, then on a `FilterIndex`
+of ``<count>`` synthetic workflows (default: 5000).
+
+``<before>`` and ``<after>`` are git revisions of ``src/workflow``.
+They default to the commits before and of the change. Pass ``.`` as
+``<after>`` to time the working tree.
+"""
+
+from __future__ import unicode_literals
+
+import sys
+
+from benchutil import best_of, import_revision, out, setup, synth
+
+# Key lengths of the adversarial keys
+LENGTHS = (100, 200, 400, 800)
+
+QUERIES = ['gc', 'alfwf', 'zq', 'gogl chrm']
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    before = sys.argv[2] if len(sys.argv) > 2 else '1b1d2d1~1'
+    after = sys.argv[3] if len(sys.argv) > 3 else '1b1d2d1'
+    setup()
+    old = import_revision(before, 'workflow_before')
+    if after == '.':
+        import workflow.workflow as new
+    else:
+        new = import_revision(after, 'workflow_after')
+    from catalogue import workflow_key
+
+    out('Query "abc" on 20 keys "aa...acb", ms')
+    out('{:<12} {:>10} {:>10}'.format('key length', 'before', 'after'))
+    for length in LENGTHS:
+        items = ['a' * length + 'cb x{}'.format(i) for i in range(20)]
+        row = []
+        for module in (old, new):
+            wf = module.Workflow()
+            row.append(best_of(lambda: wf.filter(
+                'abc', items, match_on=module.MATCH_ALLCHARS),
+                number=1))
+        out('{:<12} {:10.1f} {:10.2f}'.format(length, *row))
+
+    workflows = synth(count)
+    out('\n{} workflows, FilterIndex, MATCH_ALL, ms per query'.format(count))
+    out('{:<12} {:>10} {:>10}'.format('query', 'before', 'after'))
+    for query in QUERIES:
+        row = []
+        for module in (old, new):
+            wf = module.Workflow()
+            index = module.FilterIndex(workflows, key=workflow_key)
+            row.append(best_of(lambda: wf.filter(
+                query, index, include_score=True, max_results=51)))
+        out('{:<12} {:10.1f} {:10.1f}'.format(query, *row))
+
+
+if __name__ == '__main__':
+    main()
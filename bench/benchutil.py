@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2014 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2026-10-17
+#
+
+"""Helpers shared by the benchmark scripts in this directory.
+
+The scripts compare the code in the working tree with the code at an
+earlier git revision on a synthetic catalogue. Run them from anywhere
+with the same Python as the workflow (Python 2.7).
+"""
+
+from __future__ import print_function, unicode_literals
+
+import atexit
+from datetime import datetime
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+
+WORDS = ('google chrome safari firefox note evernote omni focus things '
+         'todo mail gmail search web dev code github git python ruby '
+         'music itunes spotify clip clipboard timer calc converter '
+         'crème brûlée Über straße währung').split()
+AUTHORS = ['Dean Jackson', 'Shawn Rice', 'Carlos-Sz', 'vitor', 'Jürgen K']
+TAGS = ['productivity', 'web', 'development', 'music', 'tools', 'system']
+CATEGORIES = ['Productivity', 'Internet', 'Tools', 'Media']
+OSX = ['10.9', '10.10', '10.11', '10.12']
+
+
+def setup():
+    """Put ``src`` on ``sys.path`` and point the workflow at temporary
+    cache and data directories"""
+    tempdir = tempfile.mkdtemp(prefix='packal-bench-')
+    atexit.register(shutil.rmtree, tempdir, True)
+    os.environ.update({
+        'alfred_workflow_bundleid': 'net.deanishe.alfred-packal-search',
+        'alfred_workflow_cache': os.path.join(tempdir, 'cache'),
+        'alfred_workflow_data': os.path.join(tempdir, 'data'),
+        'alfred_version': '3.0',
+    })
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+    return tempdir
+
+
+def import_revision(rev, name):
+    """Import ``src/workflow`` at git revision ``rev`` as package ``name``"""
+    tempdir = tempfile.mkdtemp(prefix='packal-bench-')
+    atexit.register(shutil.rmtree, tempdir, True)
+    archive = subprocess.check_output(
+        ['git', 'archive', rev, 'src/workflow'], cwd=ROOT)
+    tar = subprocess.Popen(['tar', '-x', '-C', tempdir],
+                           stdin=subprocess.PIPE)
+    tar.communicate(archive)
+    os.rename(os.path.join(tempdir, 'src', 'workflow'),
+              os.path.join(tempdir, name))
+    sys.path.insert(0, tempdir)
+    return __import__(name + '.workflow', fromlist=['workflow'])
+
+
+def synth(count, seed=1):
+    """Return ``count`` random workflow ``dict``s like the manifest's"""
+    from common import Version
+
+    r = random.Random(seed)
+    workflows = []
+    for i in range(count):
+        name = ' '.join([r.choice(WORDS).capitalize()
+                         for _ in range(r.randint(1, 3))])
+        workflows.append({
+            'name': '{} {}'.format(name, i),
+            'bundle': 'net.example.wf{}'.format(i),
+            'author': r.choice(AUTHORS),
+            'tags': r.sample(TAGS, r.randint(0, 3)),
+            'categories': r.sample(CATEGORIES, r.randint(0, 2)),
+            'osx': r.sample(OSX, r.randint(0, 3)),
+            'updated': datetime.fromtimestamp(
+                1400000000 + r.randint(0, 10 ** 8)),
+            'version': Version('{}.{}'.format(r.randint(0, 3),
+                                              r.randint(0, 9))),
+            'status': r.choice([-1, 0, 1, 2, 3]),
+            'url': 'http://www.packal.org/workflow/wf{}'.format(i),
+            'short': 'Does {} things with {}'.format(r.choice(WORDS),
+                                                     r.choice(WORDS)),
+            'description': ' '.join([r.choice(WORDS) for _ in range(20)]),
+        })
+    return workflows
+
+
+def out(text):
+    """Print ``text`` as UTF-8, whatever the output is"""
+    print(text.encode('utf-8'))
+
+
+def best_of(func, number=3, repeat=3):
+    """Return best time of ``func`` in milliseconds"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / \
+        number * 1000
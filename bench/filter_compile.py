@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2014 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2026-10-17
+#
+
+"""filter_compile.py [<count> [<before> [<after>]]]
+
+Time `Workflow.filter` with queries compiled once against the
+implementation before that change, on a plain list and on a
+`FilterIndex` of ``<count>`` synthetic workflows (default: 5000).
+
+``<before>`` and ``<after>`` are git revisions of ``src/workflow``.
+They default to the commits before and of the change. Pass ``.`` as
+``<after>`` to time the working tree.
+"""
+
+from __future__ import unicode_literals
+
+import sys
+
+from benchutil import best_of, import_revision, out, setup, synth
+
+QUERIES = ['go', 'google chrome', 'alfred git hub', 'a e i o', 'täg ma']
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    before = sys.argv[2] if len(sys.argv) > 2 else 'd6b9e4a~1'
+    after = sys.argv[3] if len(sys.argv) > 3 else 'd6b9e4a'
+    setup()
+    old = import_revision(before, 'workflow_before')
+    if after == '.':
+        import workflow.workflow as new
+    else:
+        new = import_revision(after, 'workflow_after')
+    from catalogue import workflow_key
+
+    workflows = synth(count)
+    out('{} workflows, ms per query (plain list / FilterIndex)'.format(
+        count))
+    out('{:<16} {:>15} {:>15}'.format('query', 'before', 'after'))
+    for query in QUERIES:
+        row = []
+        for module in (old, new):
+            wf = module.Workflow()
+            index = module.FilterIndex(workflows, key=workflow_key)
+            rules = module.MATCH_ALL ^ module.MATCH_ALLCHARS
+            for items in (workflows, index):
+                row.append(best_of(lambda: wf.filter(
+                    query, items, workflow_key, include_score=True,
+                    max_results=51, match_on=rules)))
+        out('{:<16} {:6.1f} / {:6.1f} {:6.1f} / {:6.1f}'.format(
+            query, *row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2014 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2026-10-17
+#
+
+"""search.py [<count>]
+
+Time ``packal.py workflows <query>`` end to end on ``<count>`` synthetic
+workflows (default: 2000) and check that the search index doesn't
+change the results.
+
+Each query is run in this process like the query server would run it,
+but without keeping caches loaded between runs, i.e. the time includes
+loading the caches, but not starting Python and importing modules.
+Each query is run with all caches and again without the search index
+(``scan``). The outputs must be identical.
+"""
+
+from __future__ import unicode_literals
+
+from cStringIO import StringIO
+import logging
+import os
+import sys
+
+from benchutil import best_of, out, setup, synth
+
+QUERIES = ['goo', 'dean', 'spot ctrl', 'goo chrm', 'ssh term', 'itu fin',
+           'web dev', 'g', 'crème', 'om fo', 'gc']
+
+
+def seed(count):
+    """Build caches of ``count`` synthetic workflows"""
+    import update_workflows
+    from workflow import Workflow
+
+    workflows = synth(count)
+    wf = Workflow()
+    update_workflows.log = wf.logger
+    update_workflows.get_packal_workflows = \
+        lambda validators=None: (iter(workflows), {})
+    update_workflows.get_installed_workflows = lambda scans=None: ({}, {})
+    sys.argv = ['update_workflows.py', '--force-update']
+    update_workflows.main(wf)
+    return wf
+
+
+def run(wf, args):
+    """Return output of ``packal.py`` called with ``args``"""
+    import packal
+    from workflow import Workflow
+
+    # Don't let earlier queries narrow this one
+    path = wf.cachefile('{}.{}'.format(packal.QUERY_CACHE_NAME,
+                                       wf.cache_serializer))
+    if os.path.exists(path):
+        os.unlink(path)
+
+    stdout, argv = sys.stdout, sys.argv
+    sys.stdout = StringIO()
+    sys.argv = ['packal.py'] + args
+    try:
+        wf = Workflow()
+        packal.log = wf.logger
+        wf.run(packal.PackalWorkflow().run)
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout, sys.argv = stdout, argv
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    setup()
+    from catalogue import INDEX_NAME
+
+    wf = seed(count)
+    logging.disable(logging.CRITICAL)
+    index = wf.cachefile('{}.{}'.format(INDEX_NAME, wf.cache_serializer))
+
+    out('{} workflows, ms per query'.format(count))
+    out('{:<12} {:>8} {:>8} {:>8}  {}'.format('query', 'index', 'scan',
+                                             'results', 'same'))
+    failed = False
+    for query in QUERIES:
+        args = ['workflows', query]
+        output = run(wf, args)
+        indexed = best_of(lambda: run(wf, args))
+        os.rename(index, index + '.hidden')
+        try:
+            expected = run(wf, args)
+            scanned = best_of(lambda: run(wf, args))
+        finally:
+            os.rename(index + '.hidden', index)
+
+        same = output == expected
+        failed = failed or not same
+        out('{:<12} {:8.1f} {:8.1f} {:8d}  {}'.format(
+            query, indexed, scanned, output.count(b'<item'),
+            'yes' if same else 'NO'))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,899 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2014 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2026-10-17
+#
+
+"""The workflow catalogue and search structures built from it.
+
+``update_workflows.py`` builds these when it refreshes the ``workflows``
+cache and ``packal.py`` reads them to avoid loading and scanning the
+whole catalogue on every keystroke.
+
+The ``workflows`` cache is stored in a columnar format by
+:class:`CatalogueSerializer`. Workflow IDs are indices into the catalogue.
+"""
+
+from __future__ import print_function, unicode_literals
+
+from array import array
+from datetime import datetime
+import heapq
+import math
+import marshal
+import mmap
+import struct
+import time
+
+from workflow import manager
+from workflow.workflow import isascii, split_on_delimiters
+
+from common import (Version, STATUS_SPLITTER, STATUS_UPDATE_AVAILABLE,
+                    STATUS_UP_TO_DATE)
+
+# Name of the cache the catalogue is stored under
+CATALOGUE_NAME = 'workflows'
+# Name of the serializer the catalogue is stored with
+CATALOGUE_SERIALIZER = 'catalogue'
+
+# Name of the cache the search index is stored under
+INDEX_NAME = 'workflows-index'
+# Name of the cache the facet tables are stored under
+FACETS_NAME = 'workflows-facets'
+# Name of the cache the trigram index of search key words is stored under
+TRIGRAM_NAME = 'workflows-trigrams'
+# Name of the cache the full-text index of descriptions is stored under
+TEXT_INDEX_NAME = 'workflows-text'
+# Name of the cache the sort orders of the catalogue are stored under
+ORDERS_NAME = 'workflows-orders'
+# Name of the cache the IDs of bundle IDs are stored under
+BUNDLES_NAME = 'workflows-bundles'
+
+# Orders workflows can be listed in besides catalogue order
+SORT_ORDERS = ('updated', 'name', 'author')
+
+# Length of the longest substrings of search terms in the search index
+GRAM_SIZE = 3
+
+# Workflow attributes in the full-text index
+TEXT_KEYS = ('short', 'description')
+
+# BM25 parameters: term frequency saturation and length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Static score: weights of recency and install status. The recency score
+# halves every `RECENCY_HALF_LIFE` days since the workflow was updated
+RECENCY_WEIGHT = 0.5
+STATUS_WEIGHT = 0.5
+RECENCY_HALF_LIFE = 365
+
+# Install status scores. Installed workflows are more likely to be
+# searched for, especially ones with updates
+STATUS_SCORES = {
+    STATUS_UPDATE_AVAILABLE: 1.0,
+    STATUS_UP_TO_DATE: 0.5,
+    STATUS_SPLITTER: 0.5,
+}
+
+# Maximum number of words per query word whose edit distance
+# `fuzzy_search()` calculates
+FUZZY_CANDIDATES = 200
+
+# Workflow attributes that can be browsed by value
+FACET_KEYS = ('tags', 'categories', 'author', 'osx')
+
+# Catalogue file signature
+MAGIC = b'PKCAT004'
+
+# Catalogue column types
+COLUMN_TEXT = 'text'  # unicode strings
+COLUMN_INT = 'int'  # integers, e.g. status codes
+COLUMN_FLOAT = 'float'  # floats, e.g. static scores
+COLUMN_TIME = 'time'  # datetimes, stored as timestamps
+COLUMN_VERSION = 'version'  # `common.Version`, stored as version strings
+COLUMN_STRINGS = 'strings'  # lists of strings, stored as string table
+                            # and table indices
+
+
+class Record(object):
+    """A read-only view of one workflow in a :class:`Catalogue`.
+
+    Supports the ``dict`` methods used on workflows. Values are read
+    from the catalogue on access.
+
+    """
+
+    __slots__ = ('catalogue', 'id')
+
+    def __init__(self, catalogue, id_):
+        self.catalogue = catalogue
+        self.id = id_
+
+    def __getitem__(self, key):
+        return self.catalogue.value(key, self.id)
+
+    def __contains__(self, key):
+        return key in self.catalogue.keys()
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        return self[key]
+
+    def keys(self):
+        return self.catalogue.keys()
+
+    def __repr__(self):
+        return 'Record({0!r})'.format(self.id)
+
+
+class Catalogue(object):
+    """Columnar workflow catalogue read from a cache file.
+
+    The file is normally memory-mapped. Single values are read by offset
+    and whole columns are only decoded when requested, so only the pages
+    that are actually needed are read. Items are :class:`Record` views.
+
+    :param buf: contents of a file written by :func:`pack_catalogue`
+    :type buf: ``mmap.mmap`` or ``str``
+    :raises ValueError: if ``buf`` isn't a catalogue or is truncated
+
+    """
+
+    def __init__(self, buf):
+        if buf[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a workflow catalogue')
+
+        self._buf = buf
+        start = len(MAGIC) + 4
+        self._check(start)
+        size = struct.unpack_from(b'<I', buf, len(MAGIC))[0]
+        self._check(start + size)
+        try:
+            header = marshal.loads(buf[start:start + size])
+            self._count = header['count']
+            self._columns = header['columns']
+            #: ID of the update that wrote the catalogue. Indices
+            #: written by the same update store the same ID
+            self.build = header['build']
+        except (EOFError, KeyError, TypeError, ValueError):
+            raise ValueError('Invalid workflow catalogue header')
+
+        self._body = start + size
+        self._decoded = {}
+        self._tables = {}
+
+        # Reading a value past the end of the file raises `struct.error`,
+        # so check the columns fit now, while a rebuild is simple
+        for kind, offset in self._columns.values():
+            self._check(self._column_end(kind, self._body + offset))
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('catalogue index out of range')
+        return Record(self, i)
+
+    def __iter__(self):
+        for i in xrange(self._count):
+            yield Record(self, i)
+
+    def keys(self):
+        """Return names of catalogue columns"""
+        return self._columns.keys()
+
+    def column(self, key):
+        """Return list of stored values of column ``key``.
+
+        Timestamps and version strings are not converted to
+        ``datetime`` and :class:`~common.Version` objects.
+
+        """
+        if key in self._decoded:
+            return self._decoded[key]
+
+        kind, offset = self._columns[key]
+        pos = self._body + offset
+        n = self._count
+        if kind == COLUMN_INT:
+            values = list(struct.unpack_from(b'<%dq' % n, self._buf, pos))
+        elif kind == COLUMN_FLOAT:
+            values = list(struct.unpack_from(b'<%dd' % n, self._buf, pos))
+        elif kind == COLUMN_TIME:
+            values = [None if v != v else v  # NaN is missing
+                      for v in struct.unpack_from(b'<%dd' % n, self._buf,
+                                                  pos)]
+        elif kind == COLUMN_STRINGS:
+            table, pos = self._table(key)
+            bounds = struct.unpack_from(b'<%dI' % (n + 1), self._buf, pos)
+            indices = struct.unpack_from(b'<%dI' % bounds[-1], self._buf,
+                                         pos + 4 * (n + 1))
+            values = [[table[j] for j in indices[bounds[i]:bounds[i + 1]]]
+                      for i in xrange(n)]
+        else:
+            values = self._text_block(pos, n)[0]
+
+        self._decoded[key] = values
+        return values
+
+    def value(self, key, i):
+        """Return value of ``key`` for workflow ``i``"""
+        kind, offset = self._columns[key]
+        if key in self._decoded:
+            value = self._decoded[key][i]
+        else:
+            value = self._read(kind, self._body + offset, key, i)
+
+        if kind == COLUMN_TIME:
+            if value is None or value != value:
+                return None
+            return datetime.fromtimestamp(value)
+        elif kind == COLUMN_VERSION:
+            if not value:
+                return None
+            return Version(value)
+        elif kind == COLUMN_STRINGS:
+            return list(value)
+        return value
+
+    def _read(self, kind, pos, key, i):
+        """Read stored value ``i`` of column ``key`` at ``pos``"""
+        if kind == COLUMN_INT:
+            return struct.unpack_from(b'<q', self._buf, pos + 8 * i)[0]
+        elif kind in (COLUMN_FLOAT, COLUMN_TIME):
+            return struct.unpack_from(b'<d', self._buf, pos + 8 * i)[0]
+        elif kind == COLUMN_STRINGS:
+            table, pos = self._table(key)
+            start, end = struct.unpack_from(b'<2I', self._buf, pos + 4 * i)
+            indices = struct.unpack_from(
+                b'<%dI' % (end - start), self._buf,
+                pos + 4 * (self._count + 1 + start))
+            return [table[j] for j in indices]
+
+        start, end = struct.unpack_from(b'<2I', self._buf, pos + 4 * i)
+        pos += 4 * (self._count + 1)
+        return self._buf[pos + start:pos + end].decode('utf-8')
+
+    def _table(self, key):
+        """Return string table of column ``key`` and position of its rows"""
+        if key not in self._tables:
+            pos = self._body + self._columns[key][1]
+            size = struct.unpack_from(b'<I', self._buf, pos)[0]
+            self._tables[key] = self._text_block(pos + 4, size)
+        return self._tables[key]
+
+    def _check(self, end):
+        """Raise :class:`ValueError` if file is shorter than ``end``"""
+        if end > len(self._buf):
+            raise ValueError('Workflow catalogue is truncated')
+
+    def _column_end(self, kind, pos):
+        """Return end position of column of type ``kind`` at ``pos``"""
+        n = self._count
+        if kind in (COLUMN_INT, COLUMN_FLOAT, COLUMN_TIME):
+            return pos + 8 * n
+        elif kind == COLUMN_STRINGS:
+            self._check(pos + 4)
+            size = struct.unpack_from(b'<I', self._buf, pos)[0]
+            pos = self._text_end(pos + 4, size)
+            self._check(pos + 4 * (n + 1))
+            indices = struct.unpack_from(b'<I', self._buf, pos + 4 * n)[0]
+            return pos + 4 * (n + 1 + indices)
+        return self._text_end(pos, n)
+
+    def _text_end(self, pos, count):
+        """Return end position of text block at ``pos``"""
+        self._check(pos + 4 * (count + 1))
+        size = struct.unpack_from(b'<I', self._buf, pos + 4 * count)[0]
+        return pos + 4 * (count + 1) + size
+
+    def _text_block(self, pos, count):
+        """Return strings in text block at ``pos`` and position of its end"""
+        offsets = struct.unpack_from(b'<%dI' % (count + 1), self._buf, pos)
+        pos += 4 * (count + 1)
+        data = self._buf[pos:pos + offsets[-1]]
+        values = [data[offsets[j]:offsets[j + 1]].decode('utf-8')
+                  for j in xrange(count)]
+        return values, pos + offsets[-1]
+
+
+def _column_type(values):
+    """Return ``COLUMN_*`` type for list of ``values``"""
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, datetime):
+            return COLUMN_TIME
+        elif isinstance(value, Version):
+            return COLUMN_VERSION
+        elif isinstance(value, list):
+            return COLUMN_STRINGS
+        elif isinstance(value, (int, long)):
+            return COLUMN_INT
+        elif isinstance(value, float):
+            return COLUMN_FLOAT
+        elif isinstance(value, basestring):
+            return COLUMN_TEXT
+        raise TypeError('Unsupported catalogue value : {0!r}'.format(value))
+    return COLUMN_TEXT
+
+
+def _pack_text(values):
+    """Return text block of ``values``: offsets then UTF-8 data"""
+    data = [(v or '').encode('utf-8') for v in values]
+    offsets = [0]
+    for s in data:
+        offsets.append(offsets[-1] + len(s))
+    return struct.pack(b'<%dI' % len(offsets), *offsets) + b''.join(data)
+
+
+def _pack_column(kind, values):
+    """Return ``values`` as fixed-layout column of type ``kind``"""
+    n = len(values)
+    if kind == COLUMN_INT:
+        return struct.pack(b'<%dq' % n, *[v or 0 for v in values])
+    elif kind == COLUMN_FLOAT:
+        return struct.pack(b'<%dd' % n, *[v or 0.0 for v in values])
+    elif kind == COLUMN_TIME:
+        return struct.pack(b'<%dd' % n, *[
+            float('nan') if v is None else
+            time.mktime(v.timetuple()) + v.microsecond / 1e6
+            for v in values])
+    elif kind == COLUMN_VERSION:
+        return _pack_text([v and v.version_string for v in values])
+    elif kind == COLUMN_STRINGS:
+        table = sorted(set([s for v in values for s in v or []]))
+        positions = dict([(s, j) for j, s in enumerate(table)])
+        bounds = [0]
+        indices = []
+        for v in values:
+            indices.extend([positions[s] for s in v or []])
+            bounds.append(len(indices))
+        return b''.join([struct.pack(b'<I', len(table)),
+                         _pack_text(table),
+                         struct.pack(b'<%dI' % len(bounds), *bounds),
+                         struct.pack(b'<%dI' % len(indices), *indices)])
+    return _pack_text(values)
+
+
+def pack_catalogue(workflows, build=None):
+    """Return ``workflows`` in catalogue file format.
+
+    The file is :const:`MAGIC`, the length of the header as a 4-byte
+    integer, the :mod:`marshal`-ed header and then the columns. The
+    header is a ``dict`` with the number of workflows, the ``build`` ID
+    and the type and offset of each column.
+
+    Columns have a fixed layout, so any value can be read by offset.
+    Integers, floats and timestamps are arrays of 8-byte values. Text is
+    an array of ``count + 1`` 4-byte offsets followed by the UTF-8 data.
+    Lists of strings are the size of the string table, the table as text,
+    an array of ``count + 1`` offsets into the list of 4-byte table
+    indices and that list. Missing text is stored as an empty string and
+    missing timestamps as NaN.
+
+    :param workflows: workflow ``dict``s
+    :param build: ID of the update writing the catalogue
+    :returns: catalogue file contents
+    :rtype: ``str``
+
+    """
+    keys = set()
+    for workflow in workflows:
+        keys.update(workflow.keys())
+
+    columns = {}
+    blobs = []
+    offset = 0
+    for key in sorted(keys):
+        values = [workflow.get(key) for workflow in workflows]
+        kind = _column_type(values)
+        blob = _pack_column(kind, values)
+        columns[key] = (kind, offset)
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = marshal.dumps({'count': len(workflows), 'build': build,
+                            'columns': columns}, 2)
+    return b''.join([MAGIC, struct.pack(b'<I', len(header)), header] + blobs)
+
+
+class CatalogueSerializer(object):
+    """Serializer for the workflow catalogue.
+
+    Dumps a ``dict`` with the ``build`` ID and the list of ``workflows``
+    in the fixed layout written by :func:`pack_catalogue` and loads it
+    as a memory-mapped :class:`Catalogue`.
+
+    """
+
+    @classmethod
+    def load(cls, file_obj):
+        """Load :class:`Catalogue` from open file"""
+        try:
+            buf = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError):  # e.g. empty file
+            buf = file_obj.read()
+        return Catalogue(buf)
+
+    @classmethod
+    def dump(cls, obj, file_obj):
+        """Write ``obj``'s workflows and build ID to open file"""
+        file_obj.write(pack_catalogue(obj['workflows'], obj['build']))
+
+
+manager.register(CATALOGUE_SERIALIZER, CatalogueSerializer)
+
+
+def static_score(workflow, now):
+    """Return query-independent score of ``workflow`` between 0 and 1.
+
+    Blends how recently the workflow was updated (as of ``now``) and its
+    install status using :const:`RECENCY_WEIGHT` and
+    :const:`STATUS_WEIGHT`.
+
+    """
+    recency = 0.0
+    if workflow.get('updated'):
+        days = max((now - workflow['updated']).total_seconds(), 0) / 86400
+        recency = 0.5 ** (days / RECENCY_HALF_LIFE)
+    status = STATUS_SCORES.get(workflow.get('status'), 0.0)
+    return (RECENCY_WEIGHT * recency + STATUS_WEIGHT * status) / \
+        (RECENCY_WEIGHT + STATUS_WEIGHT)
+
+
+def workflow_key(workflow):
+    """Return text search key for workflow"""
+    # I wish tags were in the manifest :(
+    elements = [workflow['name']]
+    elements.extend(workflow['tags'])
+    elements.extend(workflow['categories'])
+    elements.append(workflow['author'])
+    return ' '.join(elements)
+
+
+def build_search_index(workflows, fold):
+    """Return index of the search keys of ``workflows`` for
+    :func:`search_candidates`.
+
+    The index is a ``dict`` with keys ``count``, the number of
+    workflows, ``keys``, their lowercase ASCII-folded search keys joined
+    with newlines, ``starts``, the position of each key in ``keys``,
+    ``terms``, the sorted list of the whitespace-separated words of the
+    keys, ``ids``, the IDs of the workflows with each term, and ``grams``,
+    mapping every substring of up to :const:`GRAM_SIZE` characters of
+    the terms to the positions of the terms that contain it. IDs and
+    positions are stored as packed ``array('I')`` strings.
+
+    :param workflows: workflow ``dict``s in the order they are cached
+    :param fold: function to convert search keys to ASCII, i.e.
+        :meth:`Workflow.fold_to_ascii`
+
+    """
+    # Keys are stored as one string, which unpickles much faster than a
+    # list of them
+    keys = []
+    starts = array(b'I')
+    pos = 0
+    postings = {}
+    for i, workflow in enumerate(workflows):
+        key = fold(workflow_key(workflow).strip()).lower().replace('\n', ' ')
+        keys.append(key)
+        starts.append(pos)
+        pos += len(key) + 1
+        for term in set(key.split()):
+            postings.setdefault(term, array(b'I')).append(i)
+
+    terms = sorted(postings)
+    grams = {}
+    for j, term in enumerate(terms):
+        substrings = set()
+        for n in xrange(1, GRAM_SIZE + 1):
+            substrings.update([term[k:k + n]
+                               for k in xrange(len(term) - n + 1)])
+        for gram in substrings:
+            grams.setdefault(gram, array(b'I')).append(j)
+
+    return {'count': len(workflows), 'keys': '\n'.join(keys),
+            'starts': starts.tostring(), 'terms': terms,
+            'ids': [postings[term].tostring() for term in terms],
+            'grams': dict([(k, v.tostring()) for k, v in grams.iteritems()])}
+
+
+def is_subsequence(word, text, start=0, end=None):
+    """Return ``True`` if the characters of ``word`` occur in
+    ``text[start:end]`` in order, i.e. ``word`` matches it under
+    :const:`~workflow.MATCH_ALLCHARS`"""
+    pos = start - 1
+    for c in word:
+        pos = text.find(c, pos + 1, end)
+        if pos < 0:
+            return False
+    return True
+
+
+def matching_terms(index, word):
+    """Return positions of the terms in ``index`` that contain ``word``.
+
+    Only the terms that contain all of ``word``'s substrings of
+    :const:`GRAM_SIZE` characters are checked.
+
+    """
+    n = min(GRAM_SIZE, len(word))
+    lists = []
+    for k in xrange(len(word) - n + 1):
+        data = index['grams'].get(word[k:k + n])
+        if data is None:
+            return []
+        lists.append(data)
+
+    lists.sort(key=len)
+    positions = set(array(b'I', lists[0]))
+    for data in lists[1:]:
+        positions.intersection_update(array(b'I', data))
+        if not positions:
+            return []
+
+    terms = index['terms']
+    return [j for j in positions if word in terms[j]]
+
+
+def search_candidates(index, query):
+    """Return sorted IDs of workflows that may match ``query``.
+
+    Every query word must match a workflow's ASCII-folded search key
+    under one of the ``MATCH_*`` rules. Every rule implies
+    :const:`~workflow.MATCH_ALLCHARS`, so the candidates are the
+    workflows whose keys contain the characters of every word in order.
+    Workflows with a term that contains the word are looked up in the
+    index, and only the keys of the others are checked.
+
+    This is not sublinear: the keys that aren't hits are still scanned,
+    and a word like ``goo`` matches a large share of all keys under
+    ``MATCH_ALLCHARS``. The index only makes the scan cheaper than
+    running :meth:`Workflow.filter` on every workflow.
+
+    Returns ``None`` if the index can't answer ``query`` (non-ASCII or
+    empty query), in which case all workflows are candidates.
+
+    """
+    words = [s for s in query.lower().split(' ') if s]
+    if not words or not isascii(query) or \
+            any([c.isspace() for c in ''.join(words)]):
+        return None
+
+    keys = index['keys']
+    starts = array(b'I', index['starts'])
+    # End of each key is the start of the next minus the newline
+    ends = starts[1:]
+    ends.append(len(keys) + 1)
+    candidates = xrange(len(starts))
+    # Most selective (longest) words first to keep the candidates few
+    for word in sorted(set(words), key=len, reverse=True):
+        hits = set()
+        for j in matching_terms(index, word):
+            hits.update(array(b'I', index['ids'][j]))
+
+        candidates = [i for i in candidates
+                      if i in hits or
+                      is_subsequence(word, keys, starts[i], ends[i] - 1)]
+        if not candidates:
+            break
+
+    return list(candidates)
+
+
+def word_trigrams(word):
+    """Return trigrams of ``word``, whose start is marked with ``$``.
+
+    One-letter words have only the bigram ``$<letter>``.
+
+    """
+    word = '$' + word
+    if len(word) < 3:
+        return [word]
+    return [word[i:i + 3] for i in xrange(len(word) - 2)]
+
+
+def build_trigram_index(workflows, fold):
+    """Return trigram index of the words in ``workflows``' search keys.
+
+    Words are the lowercase atoms of the ASCII-folded search keys. The
+    index is a ``dict`` with keys ``count``, the number of workflows,
+    ``words``, mapping each word to the IDs of its workflows, and
+    ``trigrams``, mapping each trigram (see :func:`word_trigrams`) to
+    the words that contain it.
+
+    :param workflows: workflow ``dict``s in the order they are cached
+    :param fold: function to convert search keys to ASCII, i.e.
+        :meth:`Workflow.fold_to_ascii`
+
+    """
+    words = {}
+    for i, workflow in enumerate(workflows):
+        value = fold(workflow_key(workflow)).lower()
+        for word in set(split_on_delimiters(value)):
+            if word:
+                words.setdefault(word, []).append(i)
+
+    trigrams = {}
+    for word in words:
+        # Also index initial bigram for one-letter query words
+        for trigram in set(word_trigrams(word) + ['$' + word[0]]):
+            trigrams.setdefault(trigram, []).append(word)
+
+    return {'count': len(workflows), 'words': words, 'trigrams': trigrams}
+
+
+def max_typos(word):
+    """Return number of typos :func:`fuzzy_search` allows in ``word``"""
+    if len(word) < 4:
+        return 0
+    elif len(word) < 8:
+        return 1
+    return 2
+
+
+def prefix_distance(word, other, limit):
+    """Return edit distance between ``word`` and closest prefix of ``other``.
+
+    Insertions, deletions, substitutions and transpositions of adjacent
+    letters count as one edit each. Returns ``limit + 1`` as soon as
+    the distance is known to be greater than ``limit``.
+
+    """
+    # Longer prefixes are more than `limit` edits away
+    other = other[:len(word) + limit]
+    before, previous = None, range(len(other) + 1)
+    for i, c in enumerate(word, 1):
+        row = [i]
+        for j, d in enumerate(other, 1):
+            cost = min(previous[j] + 1, row[j - 1] + 1,
+                       previous[j - 1] + (c != d))
+            if (i > 1 and j > 1 and c == other[j - 2] and
+                    word[i - 2] == d):
+                cost = min(cost, before[j - 2] + 1)
+            row.append(cost)
+
+        if min(row) > limit:
+            return limit + 1
+        before, previous = previous, row
+
+    return min(min(previous), limit + 1)
+
+
+def fuzzy_search(index, query):
+    """Return workflows that match ``query`` allowing for typos.
+
+    Each word of ``query`` must be at most :func:`max_typos` edits away
+    from the start of a word in a workflow's search key. Candidate words
+    are found by their trigrams and only the
+    :const:`FUZZY_CANDIDATES` with the most trigrams in common with the
+    query word are checked.
+
+    :param index: trigram index from :func:`build_trigram_index`
+    :param query: query to match
+    :returns: ``{id: typos}`` for matching workflows or ``None`` if
+        ``query`` is not ASCII or has no words
+
+    """
+    words = [s for s in split_on_delimiters(query.lower()) if s]
+    if not words or not isascii(query):
+        return None
+
+    matches = None
+    for word in words:
+        limit = max_typos(word)
+        trigrams = set(word_trigrams(word))
+        shared = {}
+        for trigram in trigrams:
+            for other in index['trigrams'].get(trigram, ()):
+                shared[other] = shared.get(other, 0) + 1
+
+        # Each edit changes at most 4 trigrams
+        needed = max(1, len(trigrams) - 4 * limit)
+        candidates = heapq.nlargest(
+            FUZZY_CANDIDATES,
+            [(n, other) for other, n in shared.iteritems() if n >= needed])
+
+        typos = {}
+        for _, other in candidates:
+            n = prefix_distance(word, other, limit)
+            if n > limit:
+                continue
+            for i in index['words'][other]:
+                if n < typos.get(i, limit + 1):
+                    typos[i] = n
+
+        if matches is None:
+            matches = typos
+        else:
+            matches = dict([(i, n + matches[i]) for i, n in typos.iteritems()
+                            if i in matches])
+
+        if not matches:
+            break
+
+    return matches
+
+
+def text_terms(text, fold):
+    """Return list of full-text index terms in ``text``.
+
+    Terms are the lowercase atoms of the ASCII-folded text.
+
+    """
+    return [s for s in split_on_delimiters(fold(text).lower()) if s]
+
+
+def build_text_index(workflows, fold):
+    """Return BM25 full-text index of the :const:`TEXT_KEYS` of ``workflows``.
+
+    The index is a ``dict`` with keys ``count``, the number of
+    workflows, ``lengths``, the number of terms of each workflow,
+    ``average``, their average, and ``postings``, mapping each term to
+    the IDs of the workflows that contain it followed by the number of
+    times they contain it. ``lengths`` and ``postings`` are stored as
+    packed ``array('I')`` strings to keep the index small.
+
+    :param workflows: workflow ``dict``s in the order they are cached
+    :param fold: function to convert text to ASCII, i.e.
+        :meth:`Workflow.fold_to_ascii`
+
+    """
+    lengths = array(b'I')
+    postings = {}
+    for i, workflow in enumerate(workflows):
+        terms = []
+        for key in TEXT_KEYS:
+            terms.extend(text_terms(workflow.get(key) or '', fold))
+
+        lengths.append(len(terms))
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, n in counts.iteritems():
+            postings.setdefault(term, array(b'I')).extend((i, n))
+
+    average = float(sum(lengths)) / len(lengths) if lengths else 0.0
+    return {'count': len(workflows), 'lengths': lengths.tostring(),
+            'average': average,
+            'postings': dict([(k, v.tostring())
+                              for k, v in postings.iteritems()])}
+
+
+def text_search(index, query, fold, count):
+    """Return IDs of the ``count`` workflows that best match ``query``.
+
+    Workflows are ranked by their BM25 score for the terms of ``query``.
+    Workflows that contain none of them are not returned.
+
+    :param index: full-text index from :func:`build_text_index`
+    :param query: query to match
+    :param fold: function to convert ``query`` to ASCII
+    :param count: maximum number of IDs to return
+    :returns: list of ``(score, id)`` tuples, best first
+
+    """
+    total = index['count']
+    lengths = array(b'I')
+    lengths.fromstring(index['lengths'])
+    average = index['average'] or 1.0
+    # Length normalisation is `fixed + scale * length`
+    fixed = BM25_K1 * (1.0 - BM25_B)
+    scale = BM25_K1 * BM25_B / average
+
+    scores = {}
+    for term in set(text_terms(query, fold)):
+        data = index['postings'].get(term)
+        if data is None:
+            continue
+        postings = array(b'I')
+        postings.fromstring(data)
+        found = len(postings) // 2
+        idf = math.log(1.0 + (total - found + 0.5) / (found + 0.5))
+        for j in xrange(0, len(postings), 2):
+            i, n = postings[j], postings[j + 1]
+            scores[i] = (scores.get(i, 0.0) + idf * n * (BM25_K1 + 1.0) /
+                         (n + fixed + scale * lengths[i]))
+
+    return heapq.nlargest(count, [(v, k) for k, v in scores.iteritems()])
+
+
+def build_orders(workflows):
+    """Return the :const:`SORT_ORDERS` of ``workflows``.
+
+    The result is a ``dict`` with key ``count``, the number of
+    workflows, and the IDs of the workflows in each order as a packed
+    ``array('I')`` string: most recently updated first, by name and by
+    author then name.
+
+    :param workflows: workflow ``dict``s in the order they are cached
+
+    """
+    ids = xrange(len(workflows))
+    keys = {
+        'updated': lambda i: workflows[i]['updated'],
+        'name': lambda i: workflows[i]['name'].lower(),
+        'author': lambda i: (workflows[i]['author'].lower(),
+                             workflows[i]['name'].lower()),
+    }
+    orders = {'count': len(workflows)}
+    for name in SORT_ORDERS:
+        order = sorted(ids, key=keys[name], reverse=name == 'updated')
+        orders[name] = array(b'I', order).tostring()
+    return orders
+
+
+def build_bundle_ids(workflows):
+    """Return map of bundle IDs of ``workflows`` to workflow IDs.
+
+    The result is a ``dict`` with keys ``count``, the number of
+    workflows, and ``ids``, mapping each bundle ID to the ID of the
+    first workflow with it.
+
+    :param workflows: workflow ``dict``s in the order they are cached
+
+    """
+    ids = {}
+    for i, workflow in enumerate(workflows):
+        ids.setdefault(workflow['bundle'], i)
+
+    return {'count': len(workflows), 'ids': ids}
+
+
+def bitset_ids(bits):
+    """Return sorted list of the IDs set in bitset ``bits``"""
+    # Least-significant bit (ID 0) first
+    s = bin(bits)[:1:-1]
+    ids = []
+    i = s.find('1')
+    while i > -1:
+        ids.append(i)
+        i = s.find('1', i + 1)
+    return ids
+
+
+def bitset_count(bits):
+    """Return number of IDs set in bitset ``bits``"""
+    return bin(bits).count('1')
+
+
+def build_facet(workflows, key):
+    """Return facet table for attribute ``key`` of ``workflows``.
+
+    The table is a ``dict`` with keys ``counts``, a list of
+    ``(count, value)`` tuples, most common first, and ``bits``, a
+    ``dict`` mapping each value to a bitset (``long``) of the IDs of
+    its workflows.
+
+    """
+    bits = {}
+    for i, workflow in enumerate(workflows):
+        values = workflow[key]
+        if not isinstance(values, list):
+            values = [values]
+        for value in set(values):
+            bits[value] = bits.get(value, 0) | (1 << i)
+
+    counts = sorted([(bitset_count(v), k) for (k, v) in bits.items()],
+                    reverse=True)
+    return {'counts': counts, 'bits': bits}
+
+
+def build_facets(workflows):
+    """Return facet tables for all :const:`FACET_KEYS` of ``workflows``"""
+    facets = {'count': len(workflows)}
+    for key in FACET_KEYS:
+        facets[key] = build_facet(workflows, key)
+
+    return facets
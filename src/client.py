@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2014 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2026-10-17
+#
+
+"""client.py <action> [<query>]
+
+Thin Script Filter client for the query server in ``server.py``.
+
+Forwards its arguments to the server and prints the feedback it returns.
+If the server is disabled or not running, runs ``packal.py`` in this
+process instead.
+
+Only uses modules that are quick to import: this script runs on every
+keystroke.
+"""
+
+from __future__ import print_function
+
+import marshal
+import os
+import socket
+import sys
+
+# Set this workflow variable to 1 to use the query server
+SERVER_VARIABLE = 'PACKAL_SERVER'
+
+# Seconds to wait for the server's response
+TIMEOUT = 5
+
+
+def server_enabled():
+    """Return ``True`` if the user has enabled the query server"""
+    return os.getenv(SERVER_VARIABLE) == '1'
+
+
+def socket_path():
+    """Return path of the query server's socket or ``None``.
+
+    The socket is in ``$TMPDIR``, not the cache directory, as the path
+    of the latter may be too long for a Unix socket.
+
+    """
+    bundleid = os.getenv('alfred_workflow_bundleid')
+    if not bundleid:  # Alfred 2
+        return None
+    return os.path.join(os.getenv('TMPDIR', '/tmp'), bundleid + '.sock')
+
+
+def request(path, args):
+    """Send ``args`` to server listening on ``path`` and return response"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(TIMEOUT)
+        sock.connect(path)
+        sock.sendall(marshal.dumps(args))
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+
+    return b''.join(chunks)
+
+
+def main():
+    path = socket_path()
+    if server_enabled() and path and os.path.exists(path):
+        try:
+            output = request(path, sys.argv[1:])
+        except socket.error:
+            output = None
+        if output:
+            sys.stdout.write(output)
+            return 0
+
+    import packal
+    return packal.main()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
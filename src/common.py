@@ -15,7 +15,15 @@ from __future__ import print_function, unicode_literals
 
 import re
 
+# Maximum age in seconds of the cached Packal manifest
 CACHE_MAXAGE = 600
+# Maximum age in seconds of the cached versions of installed workflows
+INSTALLED_MAXAGE = 120
+
+# Name of the cache the parsed Packal manifest is stored under
+MANIFEST_NAME = 'manifest'
+# Name of the cache the versions of installed workflows are stored under
+INSTALLED_NAME = 'installed'
 
 STATUS_UNKNOWN = -1  # not on Packal
 STATUS_UP_TO_DATE = 0  # current version installed
@@ -12,18 +12,26 @@
 
 from __future__ import print_function, unicode_literals
 
+from array import array
 from datetime import datetime
-from operator import itemgetter
-from collections import defaultdict
 import subprocess
 import os
+import sys
 
 from workflow import Workflow, ICON_WARNING, ICON_INFO
 from workflow.background import is_running, run_in_background
-
-from common import (CACHE_MAXAGE,
-                    STATUS_SPLITTER, STATUS_UNKNOWN, STATUS_UPDATE_AVAILABLE,
-                    STATUS_UP_TO_DATE, STATUS_NOT_INSTALLED)
+from workflow.workflow import isascii
+
+from catalogue import (BUNDLES_NAME, CATALOGUE_NAME, CATALOGUE_SERIALIZER,
+                       FACETS_NAME, INDEX_NAME, ORDERS_NAME, SORT_ORDERS,
+                       TEXT_INDEX_NAME, TRIGRAM_NAME, bitset_count,
+                       bitset_ids, build_facet, build_orders, fuzzy_search,
+                       search_candidates, text_search, workflow_key)
+from client import server_enabled
+from common import (CACHE_MAXAGE, INSTALLED_MAXAGE, INSTALLED_NAME,
+                    MANIFEST_NAME, STATUS_SPLITTER, STATUS_UNKNOWN,
+                    STATUS_UPDATE_AVAILABLE, STATUS_UP_TO_DATE,
+                    STATUS_NOT_INSTALLED)
 
 log = None
 
@@ -54,6 +62,25 @@ STATUS_NAMES = {
     STATUS_NOT_INSTALLED: 'STATUS_NOT_INSTALLED',
 }
 
+# Maximum number of search results to show
+MAX_RESULTS = 50
+
+# Minimum match score of search results to show
+MIN_SCORE = 30
+
+# Also show workflows that match the query allowing for typos if there
+# are fewer matches than this
+FUZZY_MIN_RESULTS = 5
+
+# Weight of workflows' static scores (0-1) relative to their match
+# scores in search results. Only reorders matches with similar scores
+STATIC_SCORE_WEIGHT = 10
+
+# Name of the cache of recent queries' matches
+QUERY_CACHE_NAME = 'query-cache'
+# Number of queries to remember
+QUERY_CACHE_SIZE = 20
+
 ITEM_ICONS = {
     'workflows': ICON_WFLOW,
     'tags': 'tag.png',
@@ -61,11 +88,21 @@ ITEM_ICONS = {
     'author': 'author.png'
 }
 
+# Map action names to workflow attributes. Also used as the ``<facet>:``
+# prefix of chained subsets, e.g. ``web ➣ versions:10.12 ➣ query``
+FACETS = {
+    'tags': 'tags',
+    'categories': 'categories',
+    'authors': 'author',
+    'versions': 'osx',
+}
+
 
 __usage__ = """packal.py [options] <action> [<query>]
 
 Usage:
-    packal.py workflows [<query>]
+    packal.py workflows [--sort=<order>] [<query>]
+    packal.py search [<query>]
     packal.py update
     packal.py tags [<query>]
     packal.py categories [<query>]
@@ -75,6 +112,10 @@ Usage:
     packal.py author-workflows <bundleid>
     packal.py ignore-author <author>
     packal.py status
+
+Options:
+    --sort=<order>  List workflows by `updated`, `name` or `author`
+                    instead of best first (command line only)
 """
 
 
@@ -85,7 +126,8 @@ def run_alfred(query):
         v = '3'
     subprocess.call([
         'osascript', '-e',
-        'tell application "Alfred {}" to search "{} "'.format(v, query)])
+        'tell application "Alfred {}" to search "{} "'.format(
+            v, query).encode('utf-8')])
 
 
 def relative_time(dt):
@@ -120,16 +162,6 @@ def suffix_for_status(status):
     return ' {}'.format(suffix)
 
 
-def workflow_key(workflow):
-    """Return text search key for workflow"""
-    # I wish tags were in the manifest :(
-    elements = [workflow['name']]
-    elements.extend(workflow['tags'])
-    elements.extend(workflow['categories'])
-    elements.append(workflow['author'])
-    return ' '.join(elements)
-
-
 class GoBack(Exception):
     """Raised when Workflows should back up."""
 
@@ -137,8 +169,12 @@ class GoBack(Exception):
 class PackalWorkflow(object):
     """Encapsulates the Workflow."""
 
-    def __init__(self):
+    def __init__(self, hot=None):
         self.wf = None
+        self._facets = None
+        self._queries = None
+        # Caches kept loaded between runs by the query server
+        self.hot = hot
 
     def run(self, wf):
         from docopt import docopt
@@ -146,19 +182,32 @@ class PackalWorkflow(object):
 
         args = docopt(__usage__, argv=self.wf.args)
 
-        self.workflows = self.wf.cached_data('workflows', None,
-                                             max_age=0)
+        # Columns are only decoded when the current action reads them
+        try:
+            self.workflows = self._cached(CATALOGUE_NAME,
+                                          CATALOGUE_SERIALIZER)
+        except ValueError as err:  # old or broken cache file
+            log.error('Error loading cached workflows : %s', err)
+            self.wf.cache_data(CATALOGUE_NAME, None,
+                               serializer=CATALOGUE_SERIALIZER)
+            self.workflows = None
 
         if self.workflows:
             log.debug('%d workflows in cache', len(self.workflows))
         else:
             log.debug('0 workflows in cache')
 
-        # Start update scripts if cached data is too old
-        if not self.wf.cached_data_fresh('workflows',
-                                         max_age=CACHE_MAXAGE):
+        # Start update scripts if cached data is missing or too old. The
+        # manifest and installed workflows are refreshed independently
+        if (not self.workflows or
+                not self.wf.cached_data_fresh(MANIFEST_NAME, CACHE_MAXAGE) or
+                not self.wf.cached_data_fresh(INSTALLED_NAME,
+                                              INSTALLED_MAXAGE)):
             self._update()
 
+        if server_enabled() and self.hot is None:
+            self._start_server()
+
         # Notify user if cache is being updated
         if is_running('update'):
             self.wf.add_item('Updating from Packal…',
@@ -169,26 +218,49 @@ class PackalWorkflow(object):
             self.wf.send_feedback()
             return 0
 
-        self.workflows.sort(key=itemgetter('updated'), reverse=True)
-
-        log.debug('%d workflows found in cache', len(self.workflows))
-
+        self.catalogue = self.workflows
         self.query = args.get('<query>')
         self.author = args.get('<author>')
         self.bundleid = args.get('<bundleid>')
+        self.sort = args.get('--sort')
+        if self.sort and self.sort not in SORT_ORDERS:
+            # `--sort` is for the command line. Alfred passes the whole
+            # query as one argument, e.g. `--sort=name goo`
+            log.debug('Unknown sort order : %r', self.sort)
+            self.wf.add_item('Unknown sort order',
+                             'Use one of : {}'.format(', '.join(SORT_ORDERS)),
+                             valid=False, icon=ICON_WARNING)
+            self.wf.send_feedback()
+            return 0
+
+        # These only need the workflow with `bundleid`
+        if args.get('author-workflows'):
+            return self.do_author_workflows()
+        elif args.get('open'):
+            return self.do_open()
+
+        # Search index IDs refer to the order of the catalogue, which
+        # is sorted by static score
+        self.workflows = list(self.catalogue)
+
+        log.debug('%d workflows found in cache', len(self.workflows))
 
         for key in ('tags', 'categories', 'versions', 'authors'):
             if args.get(key):
                 return self._two_stage_filter(key)
 
-        if args.get('author-workflows'):
-            return self.do_author_workflows()
-        elif args.get('workflows'):
-            return self._filter_workflows(self.workflows, self.query)
+        if args.get('workflows'):
+            order = None
+            if self.sort:
+                order = self._order(self.sort)
+            elif not (self.query or '').strip():
+                order = self._order('updated')
+            return self._filter_workflows(self.workflows, self.query,
+                                          'workflows', order)
+        elif args.get('search'):
+            return self.do_search()
         elif args.get('update'):
             return self.do_update()
-        elif args.get('open'):
-            return self.do_open()
         elif args.get('status'):
             return self.do_status()
         elif args.get('ignore-author'):
@@ -213,23 +285,44 @@ class PackalWorkflow(object):
         run_alfred('packal authors {} {}'.format(author, DELIMITER))
         return 0
 
+    def do_search(self):
+        """Search workflow descriptions"""
+        query = (self.query or '').strip()
+        if not query:
+            return self._filter_workflows(self.workflows, None,
+                                          order=self._order('updated'))
+
+        index = self._cached(TEXT_INDEX_NAME)
+        if not self._current(index):
+            log.debug('full-text index missing or stale')
+            return self._filter_workflows(self.workflows, query)
+
+        results = text_search(index, query, self.wf.fold_to_ascii,
+                              MAX_RESULTS)
+        log.debug('%d results for %r in full-text index', len(results),
+                  query)
+        return self._send_workflows([self.catalogue[i] for _, i in results])
+
     def do_status(self):
         """List workflows that can be updated or installed from Packal"""
-        results = []
-        ignored_authors = self.wf.settings.get('ignored_authors') or []
-        for workflow in self.workflows:
-            if workflow['author'] in ignored_authors:
-                log.debug('Workflow `{}` by ignored author. Skipping.'.format(
-                          workflow['bundle']))
-                continue
-
-            if workflow['status'] == STATUS_UPDATE_AVAILABLE:
-                results.append((1, workflow['updated'], workflow))
-            elif workflow['status'] == STATUS_SPLITTER:
-                results.append((0, workflow['updated'], workflow))
-
-        results.sort(reverse=True)
-        workflows = [t[2] for t in results]
+        ignored_authors = set(self.wf.settings.get('ignored_authors') or [])
+        authors = self.catalogue.column('author')
+        status = self.catalogue.column('status')
+
+        # Updates first, then workflows not installed from Packal, each
+        # most recently updated first
+        workflows = []
+        order = self._order('updated')
+        for wanted in (STATUS_UPDATE_AVAILABLE, STATUS_SPLITTER):
+            for i in order:
+                if status[i] != wanted:
+                    continue
+                if authors[i] in ignored_authors:
+                    log.debug('Workflow `{}` by ignored author. '
+                              'Skipping.'.format(self.catalogue[i]['bundle']))
+                    continue
+                workflows.append(self.catalogue[i])
+
         return self._filter_workflows(workflows, None)
 
     def do_ignore_author(self):
@@ -249,13 +342,21 @@ class PackalWorkflow(object):
     def _two_stage_filter(self, key):
         """Handle queries including ``DELIMITER``
 
-        :attr:``~PackalWorkflow.query`` is split into ``subset`` and ``query``.
-        ``subset`` is the category/tag/author/OS X version name.
+        :attr:``~PackalWorkflow.query`` is split into ``subsets`` and
+        ``query``. Each subset is a category/tag/author/OS X version name.
+
+        The first subset is a value of ``key``. Subsequent subsets may be
+        prefixed with a facet name to select a different attribute, e.g.
+        ``productivity ➣ versions:10.12 ➣ categories:Tools ➣ query``.
+        Workflows must match all subsets.
 
-        If there's only a ``subset``, show all matching workflows newest first.
+        If there are only ``subsets``, show all matching workflows newest
+        first.
 
-        If there's a ``subset`` and a ``query``, first get workflows matching
-        ``subset`` then filter them by ``query``.
+        If there are ``subsets`` and a ``query``, first get workflows matching
+        ``subsets`` then filter them by ``query``. If ``query`` starts with
+        a facet name and a colon, search that attribute of the matching
+        workflows instead.
 
         If only ``query`` is provided, search the attribute specifed by ``key``
 
@@ -266,73 +367,133 @@ class PackalWorkflow(object):
         valid = False
 
         try:
-            subset, query = self._split_query(self.query)
-        except GoBack:
+            subsets, query = self._split_query(self.query)
+        except GoBack as err:
             query = 'packal ' + key
+            # Not `_split_query()`: the query may end with more delimiters
+            parts = [s.strip() for s in err.args[0].split(DELIMITER)]
+            parent = ' {} '.format(DELIMITER).join(
+                [s for s in parts if s][:-1])
+            if parent:
+                query = '{} {} {}'.format(query, parent, DELIMITER)
             log.debug('Going back to : %s', query)
             run_alfred(query)
             return 0
         else:
-            query = query.strip()
-
-        if key == 'authors':
-            key = 'author'
-            # Enable `ignore author`
-            # valid = False
-        elif key == 'versions':
-            key = 'osx'
-
-        if subset:
-            if isinstance(self.workflows[0][key], list):
-                workflows = [w for w in self.workflows if subset in w[key]]
-            else:
-                workflows = [w for w in self.workflows if subset == w[key]]
-            return self._filter_workflows(workflows, query)
-
-        subsets = defaultdict(int)
-        for workflow in self.workflows:
-            if isinstance(workflow[key], list):
-                for subset in workflow[key]:
-                    subsets[subset] += 1
-            else:
-                subsets[workflow[key]] += 1
-
-        subsets = sorted([(v, k) for (k, v) in subsets.items()], reverse=True)
+            query = (query or '').strip()
+
+        attr = FACETS[key]
+        # Enable `ignore author`
+        # valid = key == 'authors'
+
+        bits = None
+        for subset in subsets:
+            k, value = self._parse_subset(subset, key)
+            vbits = self._facet(FACETS[k])['bits'].get(value, 0)
+            bits = vbits if bits is None else bits & vbits
+
+        prefix = ''
+        if subsets:
+            prefix = ' {} '.format(DELIMITER).join(subsets) + \
+                ' {} '.format(DELIMITER)
+            k, value = self._parse_subset(query, None)
+            if k is None:
+                workflows = [self.catalogue[i] for i in bitset_ids(bits)]
+                order = None
+                if not query:
+                    order = self._order('updated')
+                return self._filter_workflows(
+                    workflows, query, '{}:{}'.format(key, prefix), order)
+
+            # Browse values of another facet within matching workflows
+            attr, query = FACETS[k], value
+            prefix += k + ':'
+            facet = self._facet(attr)
+            results = []
+            for _, subset in facet['counts']:
+                count = bitset_count(bits & facet['bits'][subset])
+                if count:
+                    results.append((count, subset))
+            results.sort(reverse=True)
+        else:
+            results = self._facet(attr)['counts']
 
         if query:
-            subsets = wf.filter(query, subsets, lambda t: t[1], min_score=30)
+            results = self.wf.filter(query, results, lambda t: t[1],
+                                     min_score=MIN_SCORE)
 
-        icon = ITEM_ICONS.get(key, ICON_WFLOW)
+        icon = ITEM_ICONS.get(attr, ICON_WFLOW)
 
-        if not len(subsets):
+        if not len(results):
             self.wf.add_item('Nothing found', 'Try a different query',
                              valid=False, icon=ICON_WARNING)
 
-        for count, subset in subsets:
+        for count, subset in results:
             arg = None
             if valid:
                 arg = subset
-            wf.add_item(subset, '{} workflows'.format(count),
-                        autocomplete='{} {} '.format(subset, DELIMITER),
-                        valid=valid,
-                        arg=arg,
-                        icon=icon)
+            self.wf.add_item(subset, '{} workflows'.format(count),
+                             autocomplete='{}{} {} '.format(prefix, subset,
+                                                            DELIMITER),
+                             valid=valid,
+                             arg=arg,
+                             icon=icon)
 
-        wf.send_feedback()
+        self.wf.send_feedback()
         return 0
 
-    def _filter_workflows(self, workflows, query):
+    def _filter_workflows(self, workflows, query, scope=None, order=None):
         """Filter ``workflows`` against ``query`` and send the results
         to Alfred
 
+        Only the best :const:`MAX_RESULTS` matches are shown, best first
+        or in the order of the IDs in ``order``.
+
+        If ``scope`` is set and there aren't too many matches, the
+        workflows matching ``query`` are cached under it. When the user
+        types more of ``query``, only those workflows are searched.
+        ``scope`` must identify ``workflows``.
+
         """
 
         if isinstance(query, basestring):
             query = query.strip()
 
         if query:
-            workflows = self.wf.filter(query, workflows, key=workflow_key,
-                                       min_score=30)
+            pool = workflows
+            ids = None
+            if scope:
+                ids = self._cached_matches(scope, query)
+
+            if ids is None and workflows is self.workflows:
+                ids = self._search_candidates(query)
+
+            if ids is None:
+                ids = [w.id for w in workflows]
+
+            # Apply `min_score` here: items scoring lower may still match
+            # a longer query. If there are at most `MAX_RESULTS` matches,
+            # they are all returned and can be cached
+            results = self._search(query, ids)
+            if scope and len(results) <= MAX_RESULTS:
+                self._cache_matches(scope, query, [t[0] for t in results])
+            workflows = [self.catalogue[t[0]] for t in results[:MAX_RESULTS]
+                         if t[1] > MIN_SCORE]
+            if len(workflows) < FUZZY_MIN_RESULTS:
+                workflows += self._fuzzy_search(
+                    query, pool, set([w.id for w in workflows]))
+
+        if order is not None:
+            if workflows is self.workflows:
+                workflows = [self.catalogue[i] for i in order]
+            else:
+                ids = set([w.id for w in workflows])
+                workflows = [self.catalogue[i] for i in order if i in ids]
+
+        return self._send_workflows(workflows)
+
+    def _send_workflows(self, workflows):
+        """Send ``workflows`` to Alfred"""
         if not len(workflows):
             self.wf.add_item('Nothing found', 'Try a different query',
                              valid=False, icon=ICON_WARNING)
@@ -355,19 +516,232 @@ class PackalWorkflow(object):
         self.wf.send_feedback()
         return 0
 
+    def _current(self, index):
+        """Return ``True`` if ``index`` was written with the catalogue.
+
+        Workflow IDs only refer to the same workflows in an index and
+        catalogue from the same update.
+
+        """
+        return bool(index) and index.get('build') == self.catalogue.build
+
+    def _cached(self, name, serializer=None):
+        """Return data cached under ``name``.
+
+        When running in the query server, data are loaded once and
+        reused until the cache file changes.
+
+        """
+        if self.hot is None:
+            return self.wf.cached_data(name, None, max_age=0,
+                                       serializer=serializer)
+
+        path = self.wf.cachefile('{}.{}'.format(
+            name, serializer or self.wf.cache_serializer))
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+
+        if name not in self.hot or self.hot[name][0] != mtime:
+            log.debug('loading %s into query server', name)
+            self.hot[name] = (mtime, self.wf.cached_data(
+                name, None, max_age=0, serializer=serializer))
+
+        return self.hot[name][1]
+
+    def _query_cache(self):
+        """Return cache of recent queries' matches.
+
+        The cache is a ``dict`` with the ``version`` of the catalogue
+        and the list ``queries`` of ``((scope, query), ids)`` tuples,
+        most recently used last.
+
+        """
+        if self._queries is None:
+            path = self.wf.cachefile('{}.{}'.format(CATALOGUE_NAME,
+                                                    CATALOGUE_SERIALIZER))
+            version = os.stat(path).st_mtime
+            self._queries = self.wf.cached_data(QUERY_CACHE_NAME, None,
+                                                max_age=0)
+            if not self._queries or self._queries['version'] != version:
+                self._queries = {'version': version, 'queries': []}
+
+        return self._queries
+
+    def _cached_matches(self, scope, query):
+        """Return IDs of workflows matching a cached query that ``query``
+        extends or ``None``.
+
+        """
+        queries = self._query_cache()['queries']
+        best = None
+        for i, ((s, q), ids) in enumerate(queries):
+            if s == scope and query.startswith(q):
+                if best is None or len(q) > len(queries[best][0][1]):
+                    best = i
+
+        if best is None:
+            return None
+
+        entry = queries.pop(best)
+        queries.append(entry)
+        log.debug('%d workflows matched cached query %r', len(entry[1]),
+                  entry[0][1])
+        return entry[1]
+
+    def _cache_matches(self, scope, query, ids):
+        """Cache IDs of workflows matching ``query`` in ``scope``"""
+        cache = self._query_cache()
+        queries = [t for t in cache['queries'] if t[0] != (scope, query)]
+        queries.append(((scope, query), ids))
+        cache['queries'] = queries[-QUERY_CACHE_SIZE:]
+        self.wf.cache_data(QUERY_CACHE_NAME, cache)
+
+    def _order(self, name):
+        """Return IDs of all workflows in sort order ``name``.
+
+        See :const:`~catalogue.SORT_ORDERS`.
+
+        """
+        orders = self._cached(ORDERS_NAME)
+        if not self._current(orders):
+            log.debug('sort orders missing or stale')
+            orders = build_orders(self.catalogue)
+        return array(b'I', orders[name])
+
+    def _facet(self, key):
+        """Return facet table for ``key`` from cache or build it."""
+        if self._facets is None:
+            self._facets = dict(self._cached(FACETS_NAME) or {})
+            if not self._current(self._facets):
+                log.debug('facet tables missing or stale')
+                self._facets = {}
+
+        if key not in self._facets:
+            self._facets[key] = build_facet(self.catalogue, key)
+
+        return self._facets[key]
+
+    def _search(self, query, ids):
+        """Filter workflows with ``ids`` against ``query``.
+
+        :returns: best :const:`MAX_RESULTS` + 1 matches as
+            ``(id, score, rule)`` tuples
+
+        """
+        static = self.catalogue.column('static_score')
+
+        def boost(i, score):
+            # Don't boost matches that won't be shown, or they can push
+            # better matches out of the results before they are cut
+            if score <= MIN_SCORE:
+                return 0
+            return STATIC_SCORE_WEIGHT * static[i]
+
+        # Read search keys from the mmapped catalogue, so only the
+        # candidates' keys are decoded and matched
+        if 'search_key' in self.catalogue.keys():
+            key = lambda i: self.catalogue.value('search_key', i)
+        else:
+            log.debug('search keys missing from catalogue')
+            key = lambda i: workflow_key(self.catalogue[i])
+
+        return self.wf.filter(query, ids, key=key,
+                              include_score=True,
+                              max_results=MAX_RESULTS + 1, boost=boost)
+
+    def _fuzzy_search(self, query, workflows, exclude):
+        """Return workflows in ``workflows`` that match ``query`` allowing
+        for typos, fewest typos first and then in catalogue order.
+
+        Workflows whose IDs are in ``exclude`` are left out, and at most
+        :const:`MAX_RESULTS` minus their number are returned.
+
+        """
+        index = self._cached(TRIGRAM_NAME)
+        if not self._current(index):
+            log.debug('trigram index missing or stale')
+            return []
+
+        typos = fuzzy_search(index, query) or {}
+        if workflows is not self.workflows:
+            ids = [w.id for w in workflows if w.id in typos]
+        else:
+            ids = list(typos)
+
+        # Zero-typo matches may have scored too low for the exact results
+        ids = [i for i in ids if i not in exclude]
+        ids.sort(key=lambda i: (typos[i], i))
+        log.debug('%d workflows match %r with typos', len(ids), query)
+        return [self.catalogue[i] for i in ids[:MAX_RESULTS - len(exclude)]]
+
+    def _search_candidates(self, query):
+        """Return IDs of workflows that may match ``query`` according to
+        the search index, or ``None`` if the index can't be used.
+
+        """
+        if not self.wf.settings.get('__workflow_diacritic_folding', True):
+            return None
+
+        # Don't load the index for queries it can't answer
+        if not isascii(query):
+            return None
+
+        index = self._cached(INDEX_NAME)
+        if not self._current(index):
+            log.debug('search index missing or stale')
+            return None
+
+        ids = search_candidates(index, query)
+        if ids is not None:
+            log.debug('%d candidates in search index for %r', len(ids),
+                      query)
+        return ids
+
     def _workflow_by_bundleid(self, bid):
-        for workflow in self.workflows:
-            if workflow['bundle'] == bid:
-                return workflow
-        log.error('Bundle ID not found : %s', self.bundleid)
+        """Return workflow with bundle ID ``bid``"""
+        bundles = self._cached(BUNDLES_NAME)
+        if self._current(bundles):
+            i = bundles['ids'].get(bid)
+        else:
+            log.debug('bundle ID map missing or stale')
+            column = self.catalogue.column('bundle')
+            i = column.index(bid) if bid in column else None
+
+        if i is not None:
+            return self.catalogue[i]
+        log.error('Bundle ID not found : %s', bid)
         raise KeyError('Bundle ID unknown : ' + bid)
 
     def _split_query(self, query):
+        """Split ``query`` into list of subsets and final query."""
         if not query or DELIMITER not in query:
-            return None, query
+            return [], query
         elif query.endswith(DELIMITER):  # trailing space deleted
             raise GoBack(query.rstrip(DELIMITER).strip())
-        return [s.strip() for s in query.split(DELIMITER)]
+        parts = [s.strip() for s in query.split(DELIMITER)]
+        return parts[:-1], parts[-1]
+
+    def _parse_subset(self, subset, default):
+        """Split ``subset`` into ``(facet, value)``.
+
+        ``facet`` is ``default`` if ``subset`` has no ``<facet>:`` prefix.
+
+        """
+        if ':' in subset:
+            k, value = subset.split(':', 1)
+            if k in FACETS:
+                return k, value.strip()
+        return default, subset
+
+    def _start_server(self):
+        """Start query server in the background if it isn't running"""
+        if is_running('server'):
+            return
+        log.debug('Starting query server...')
+        run_in_background('server', ['/usr/bin/python',
+                                     self.wf.workflowfile('server.py')])
 
     def _update(self, force=False):
         """Update cached data"""
@@ -387,8 +761,14 @@ class PackalWorkflow(object):
         return 0
 
 
-if __name__ == '__main__':
+def main():
+    """Run workflow in this process."""
+    global log
     wf = Workflow()
     log = wf.logger
     pk = PackalWorkflow()
-    wf.run(pk.run)
+    return wf.run(pk.run)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2014 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2026-10-17
+#
+
+"""server.py
+
+Query server for ``client.py``. Keeps the workflow catalogue and search
+indices loaded and answers Script Filter queries over a Unix socket.
+
+Started in the background by ``packal.py`` if the ``PACKAL_SERVER``
+workflow variable is set to ``1``. Exits after ``IDLE_TIMEOUT`` seconds
+without a query.
+"""
+
+from __future__ import print_function, unicode_literals
+
+from cStringIO import StringIO
+import marshal
+import os
+import socket
+import sys
+
+from workflow import Workflow
+
+from client import TIMEOUT, socket_path
+import packal
+
+log = None
+
+# Seconds without a query after which the server exits
+IDLE_TIMEOUT = 600
+
+
+def handle(conn, hot):
+    """Run query received on socket ``conn`` and send back the output.
+
+    :param conn: client connection
+    :param hot: caches shared between queries. See
+        :attr:`packal.PackalWorkflow.hot`.
+
+    """
+    conn.settimeout(TIMEOUT)
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+
+    args = marshal.loads(b''.join(chunks))
+    log.debug('query : %r', args)
+
+    # `Workflow` reads its arguments from `sys.argv` and writes its
+    # feedback to `sys.stdout`
+    stdout, argv = sys.stdout, sys.argv
+    sys.stdout = StringIO()
+    sys.argv = ['packal.py'] + args
+    try:
+        wf = Workflow()
+        packal.log = wf.logger
+        try:
+            wf.run(packal.PackalWorkflow(hot).run)
+        except SystemExit:  # magic arguments exit the workflow
+            pass
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout, sys.argv = stdout, argv
+
+    conn.sendall(output)
+
+
+def main(wf):
+    path = socket_path()
+    if not path:
+        log.error('Query server requires Alfred 3')
+        return 1
+
+    if os.path.exists(path):  # left over from a crashed server
+        os.unlink(path)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(5)
+    sock.settimeout(IDLE_TIMEOUT)
+    log.debug('Query server listening on %r', path)
+
+    hot = {}
+    try:
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except socket.timeout:
+                log.debug('No queries for %d seconds', IDLE_TIMEOUT)
+                break
+
+            try:
+                handle(conn, hot)
+            except Exception as err:
+                log.exception('Error answering query : %s', err)
+            finally:
+                conn.close()
+    finally:
+        sock.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        log.debug('Query server stopped')
+
+    return 0
+
+
+if __name__ == '__main__':
+    wf = Workflow()
+    log = wf.logger
+    sys.exit(wf.run(main))
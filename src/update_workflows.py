@@ -19,7 +19,10 @@ from __future__ import print_function, unicode_literals
 import subprocess
 import sys
 import os
+import threading
+import uuid
 from datetime import datetime
+from operator import itemgetter
 from plistlib import readPlist, readPlistFromString
 
 try:
@@ -27,15 +30,38 @@ try:
 except ImportError:
     from xml.etree import ElementTree as ET
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:  # Python 2 without the `futures` backport
+    ThreadPoolExecutor = None
+
 from workflow import web, Workflow
 
-from common import (CACHE_MAXAGE, Version, STATUS_SPLITTER, STATUS_UNKNOWN,
+from catalogue import (BUNDLES_NAME, CATALOGUE_NAME, CATALOGUE_SERIALIZER,
+                       FACETS_NAME, INDEX_NAME, ORDERS_NAME, TEXT_INDEX_NAME,
+                       TRIGRAM_NAME, build_bundle_ids, build_facets,
+                       build_orders, build_search_index, build_text_index,
+                       build_trigram_index, static_score, workflow_key)
+from common import (CACHE_MAXAGE, INSTALLED_MAXAGE, INSTALLED_NAME,
+                    MANIFEST_NAME, Version, STATUS_SPLITTER, STATUS_UNKNOWN,
                     STATUS_UPDATE_AVAILABLE, STATUS_UP_TO_DATE,
                     STATUS_NOT_INSTALLED)
 
 log = None
 
 MANIFEST_URL = 'https://raw.github.com/packal/repository/master/manifest.xml'
+# Name of the cache the validators of the last manifest response are
+# stored under
+VALIDATORS_NAME = 'manifest-validators'
+# Response headers to send back to check if the manifest has changed
+VALIDATOR_HEADERS = (('etag', 'If-None-Match'),
+                     ('last-modified', 'If-Modified-Since'))
+# Bytes of the manifest to download and parse at a time
+MANIFEST_CHUNK = 16384
+# Name of the cache the scans of installed workflows are stored under
+SCANS_NAME = 'installed-scans'
+# Maximum number of threads to read installed workflows in
+SCAN_THREADS = 4
 # WORKFLOW_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ALFRED_PREFS = os.path.expanduser(
     '~/Library/Preferences/com.runningwithcrayons.Alfred-Preferences-3.plist')
@@ -95,58 +121,169 @@ def packal_metadata(xmlpath):
     return data
 
 
-def get_installed_workflows():
+def file_signature(path):
+    """Return ``(mtime, size)`` of file at ``path`` or ``None`` if it
+    doesn't exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+def thread_map(func, items, threads=SCAN_THREADS):
+    """Return ``[func(item) for item in items]``, calling ``func`` in
+    up to ``threads`` threads.
+
+    Uses :class:`concurrent.futures.ThreadPoolExecutor` if available.
+    If ``func`` raises an exception, it is raised here.
+
+    """
+    threads = min(threads, len(items))
+    if threads < 2:
+        return [func(item) for item in items]
+
+    if ThreadPoolExecutor is not None:
+        with ThreadPoolExecutor(threads) as pool:
+            return list(pool.map(func, items))
+
+    results = [None] * len(items)
+    errors = []
+    indices = iter(xrange(len(items)))
+    lock = threading.Lock()
+
+    def work():
+        while not errors:
+            with lock:
+                i = next(indices, None)
+            if i is None:
+                return
+            try:
+                results[i] = func(items[i])
+            except Exception as err:
+                errors.append(err)
+
+    workers = [threading.Thread(target=work) for _ in xrange(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+def read_workflow(path):
+    """Return ``(bundleid, version)`` of workflow in directory ``path``
+    or ``None`` if it can't be read.
+
+    ``version`` is ``None`` if workflow isn't from Packal.org
+    """
+    info_plist = os.path.join(path, 'info.plist')
+    packal_xml = os.path.join(path, 'packal', 'package.xml')
+    try:
+        bundleid = readPlist(info_plist)['bundleid']
+        if not bundleid:
+            log.warning('no bundleid in info.plist : %s', path)
+            return None
+    except Exception as err:
+        log.error('bad info.plist in workflow %r: %s', path, err)
+        return None
+
+    try:
+        metadata = {'version': None, 'bundle': bundleid}
+        if os.path.exists(packal_xml):
+            metadata.update(packal_metadata(packal_xml))
+    except Exception as err:
+        log.error('bad packal/package.xml in workflow %r: %s', path, err)
+        return None
+
+    return metadata['bundle'], metadata['version']
+
+
+def get_installed_workflows(scans=None):
     """Return ``dict`` of installed workflows
-    ``{bundleid : version}``
+    ``{bundleid : version}`` and the scans of their directories.
 
     ``version`` is ``None`` if workflow isn't from Packal.org
+
+    ``scans`` maps workflow directories to the signatures (see
+    :func:`file_signature`) of their ``info.plist`` and
+    ``packal/package.xml`` and the result of :func:`read_workflow`.
+    Pass the scans from the last call and only directories whose files
+    have changed are read again. Scans of deleted directories are
+    dropped.
     """
+    previous = scans or {}
+    scans = {}
     workflows = {}
     workflow_dir = get_workflow_directory()
 
     log.debug('reading workflows installed in %r ...', workflow_dir)
+    found = []
     for name in os.listdir(workflow_dir):
         path = os.path.join(workflow_dir, name)
-        if not os.path.isdir(path):
-            continue
+        signature = (file_signature(os.path.join(path, 'info.plist')),
+                     file_signature(os.path.join(path, 'packal',
+                                                 'package.xml')))
+        if signature[0] is not None:  # has an info.plist
+            found.append((path, signature))
+
+    # Read changed workflows in parallel: it's mostly waiting for files
+    changed = [path for path, signature in found
+               if previous.get(path, (None,))[0] != signature]
+    results = dict(zip(changed, thread_map(read_workflow, changed)))
+
+    # Add in directory order, so the last of workflows with the same
+    # bundle ID wins as before
+    for path, signature in found:
+        if path in results:
+            if results[path] is None:
+                continue
+            scans[path] = (signature, results[path])
+        else:
+            scans[path] = previous[path]
+        bundleid, version = scans[path][1]
+        workflows[bundleid] = version
 
-        info_plist = os.path.join(path, 'info.plist')
-        packal_xml = os.path.join(path, 'packal', 'package.xml')
-        if not os.path.exists(info_plist):
-            continue
+    log.debug('%d workflows installed locally, %d read', len(workflows),
+              len(changed))
+    return workflows, scans
 
-        try:
-            bundleid = readPlist(info_plist)['bundleid']
-            if not bundleid:
-                log.warning('no bundleid in info.plist : %s', path)
-                continue
-        except Exception as err:
-            log.error('bad info.plist in workflow %r: %s', path, err)
-            continue
 
-        try:
-            metadata = {'version': None, 'bundle': bundleid}
-            if os.path.exists(packal_xml):
-                metadata.update(packal_metadata(packal_xml))
-        except Exception as err:
-            log.error('bad packal/package.xml in workflow %r: %s', path, err)
-            continue
+class ChunkReader(object):
+    """Minimal file-like wrapper for an iterator of ``str`` chunks.
 
-        workflows[metadata['bundle']] = metadata['version']
+    :meth:`read` returns the next chunk whatever its size, which is
+    all :func:`~xml.etree.ElementTree.iterparse` needs.
 
-    log.debug('%d workflows installed locally', len(workflows))
-    return workflows
+    """
 
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
 
-def get_packal_workflows():
-    """Return list of workflows available on Packal.org"""
-    workflows = []
-    r = web.get(MANIFEST_URL)
-    r.raise_for_status()
-    manifest = ET.fromstring(r.content)
+    def read(self, size=-1):
+        return next(self._chunks, b'')
+
+
+def parse_manifest(source):
+    """Yield workflow ``dict``s from manifest XML in file-like ``source``.
+
+    ``source`` is parsed incrementally and each ``<workflow>`` element is
+    discarded once it has been converted, so memory use doesn't grow
+    with the size of the manifest.
+
+    """
     # these elements contain multiple, |||-delimited items
     list_elements = ('categories', 'tags', 'osx')
-    for workflow in manifest:
+    context = ET.iterparse(source, events=(b'start', b'end'))
+    _, manifest = next(context)
+    count = 0
+    for event, workflow in context:
+        if event != b'end' or workflow.tag != b'workflow':
+            continue
+
         d = {}
         for elem in workflow:
             if elem.tag in list_elements:
@@ -163,16 +300,50 @@ def get_packal_workflows():
         # convert timestamp to datetime
         d['updated'] = datetime.fromtimestamp(float(d['updated']))
         d['version'] = Version(d['version'])
-        workflows.append(d)
+        # drop converted elements
+        manifest.clear()
+        count += 1
+        yield d
+
+    log.debug('{} workflows available on Packal.org'.format(count))
+
+
+def get_packal_workflows(validators=None):
+    """Return workflows available on Packal.org and the validators of
+    the response (see :func:`response_validators`).
+
+    The workflows are an iterator that parses the manifest as it is
+    downloaded.
+
+    If ``validators`` of a previous response are given, the manifest is
+    only downloaded if it has changed since. Otherwise, the workflows
+    are ``None``.
+
+    """
+    headers = {}
+    for key, name in VALIDATOR_HEADERS:
+        if (validators or {}).get(key):
+            headers[name] = validators[key]
+
+    r = web.get(MANIFEST_URL, headers=headers, stream=True)
+    if r.status_code == 304:
+        log.debug('Manifest not modified')
+        return None, validators
+    r.raise_for_status()
+    workflows = parse_manifest(ChunkReader(r.iter_content(MANIFEST_CHUNK)))
+    return workflows, response_validators(r)
+
 
-    log.debug('{} workflows available on Packal.org'.format(len(workflows)))
-    return workflows
+def response_validators(r):
+    """Return ``dict`` of the headers of :class:`~workflow.web.Response`
+    ``r`` that tell whether the resource has changed since."""
+    return dict([(key, r.headers[key]) for key, _ in VALIDATOR_HEADERS
+                 if r.headers.get(key)])
 
 
-def get_workflows():
-    """Return list of workflows on on Packal.org with update status."""
-    local_workflows = get_installed_workflows()
-    packal_workflows = get_packal_workflows()
+def merge_workflows(packal_workflows, local_workflows):
+    """Set update status of ``packal_workflows`` from the versions of
+    installed workflows ``local_workflows``"""
     for packal_workflow in packal_workflows:
         # set version number
         bundle = packal_workflow.get('bundle')
@@ -197,16 +368,104 @@ def get_workflows():
     return packal_workflows
 
 
+def touch_cache(wf, name):
+    """Mark data cached under ``name`` as fresh"""
+    path = wf.cachefile('{}.{}'.format(name, wf.cache_serializer))
+    os.utime(path, None)
+
+
+def update_manifest(wf, force=False):
+    """Update cached Packal manifest. Return ``True`` if it changed.
+
+    Unless ``force`` is ``True``, the manifest is only downloaded if it
+    has changed since the cached one was.
+
+    """
+    validators = None
+    if not force and wf.cached_data_age(MANIFEST_NAME):
+        validators = wf.cached_data(VALIDATORS_NAME, None, max_age=0)
+
+    workflows, validators = get_packal_workflows(validators)
+    if workflows is None:
+        touch_cache(wf, MANIFEST_NAME)
+        return False
+
+    wf.cache_data(MANIFEST_NAME, list(workflows))
+    wf.cache_data(VALIDATORS_NAME, validators)
+    return True
+
+
+def update_installed(wf):
+    """Update cached versions of installed workflows. Return ``True``
+    if they changed."""
+    def versions(workflows):
+        return dict([(k, v and v.version_string)
+                     for k, v in (workflows or {}).items()])
+
+    scans = wf.cached_data(SCANS_NAME, None, max_age=0)
+    workflows, scans = get_installed_workflows(scans)
+    wf.cache_data(SCANS_NAME, scans)
+
+    cached = wf.cached_data(INSTALLED_NAME, None, max_age=0)
+    if cached is not None and versions(cached) == versions(workflows):
+        touch_cache(wf, INSTALLED_NAME)
+        return False
+
+    wf.cache_data(INSTALLED_NAME, workflows)
+    return True
+
+
 def main(wf):
     from docopt import docopt
     args = docopt(__doc__, argv=wf.args)
-    if args.get('--force-update'):
-        max_age = 1
+    force = args.get('--force-update')
+    if force:
         log.debug('Forcing update of Packal workflows')
-    else:
-        max_age = CACHE_MAXAGE
 
-    wf.cached_data('workflows', get_workflows,  max_age=max_age)
+    # The manifest and installed workflows are refreshed independently.
+    # The catalogue is only rebuilt if either changed
+    changed = not wf.cached_data_age(CATALOGUE_NAME, CATALOGUE_SERIALIZER)
+    if force or not wf.cached_data_fresh(MANIFEST_NAME, CACHE_MAXAGE):
+        changed = update_manifest(wf, force) or changed
+    if force or not wf.cached_data_fresh(INSTALLED_NAME, INSTALLED_MAXAGE):
+        changed = update_installed(wf) or changed
+
+    if not changed:
+        log.debug('Cached workflows are up to date')
+        return 0
+
+    workflows = merge_workflows(
+        wf.cached_data(MANIFEST_NAME, None, max_age=0) or [],
+        wf.cached_data(INSTALLED_NAME, None, max_age=0) or {})
+
+    # Store workflows best first, so results that are otherwise equal are
+    # in this order and `packal.py` needn't sort the catalogue
+    now = datetime.now()
+    for workflow in workflows:
+        workflow['static_score'] = static_score(workflow, now)
+        workflow['search_key'] = workflow_key(workflow)
+    workflows.sort(key=itemgetter('static_score'), reverse=True)
+
+    # The order, and so the IDs, change with every update. Tag indices
+    # and catalogue with the same build ID: `packal.py` ignores indices
+    # from another update, e.g. while this one is writing them
+    build = uuid.uuid4().hex
+
+    def cache_index(name, index):
+        index['build'] = build
+        wf.cache_data(name, index)
+
+    cache_index(INDEX_NAME, build_search_index(workflows, wf.fold_to_ascii))
+    cache_index(FACETS_NAME, build_facets(workflows))
+    cache_index(TRIGRAM_NAME, build_trigram_index(workflows,
+                                                  wf.fold_to_ascii))
+    cache_index(TEXT_INDEX_NAME, build_text_index(workflows,
+                                                  wf.fold_to_ascii))
+    cache_index(ORDERS_NAME, build_orders(workflows))
+    cache_index(BUNDLES_NAME, build_bundle_ids(workflows))
+
+    wf.cache_data(CATALOGUE_NAME, {'build': build, 'workflows': workflows},
+                  serializer=CATALOGUE_SERIALIZER)
 
 
 if __name__ == '__main__':
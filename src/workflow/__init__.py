@@ -13,7 +13,7 @@
 import os
 
 # Workflow objects
-from .workflow import Workflow, manager
+from .workflow import FilterIndex, Workflow, manager
 from .workflow3 import Variables, Workflow3
 
 # Exceptions
@@ -67,6 +67,7 @@ __licence__ = 'MIT'
 __copyright__ = 'Copyright 2014-2017 Dean Jackson'
 
 __all__ = [
+    'FilterIndex',
     'Variables',
     'Workflow',
     'Workflow3',
@@ -23,10 +23,12 @@ from __future__ import print_function, unicode_literals
 
 import atexit
 import binascii
+from collections import OrderedDict
 from contextlib import contextmanager
 import cPickle
 from copy import deepcopy
 import errno
+import heapq
 import json
 import logging
 import logging.handlers
@@ -385,6 +387,9 @@ ASCII_REPLACEMENTS = {
     'ỹ': 'y',
 }
 
+# `ASCII_REPLACEMENTS` as a table for `unicode.translate()`
+_ASCII_TRANSLATIONS = dict((ord(c), r) for c, r in ASCII_REPLACEMENTS.items())
+
 ####################################################################
 # Smart-to-dumb punctuation mapping
 ####################################################################
@@ -433,6 +438,28 @@ MATCH_ALLCHARS = 64
 #: Combination of all other ``MATCH_*`` constants
 MATCH_ALL = 127
 
+#: Number of :const:`MATCH_ALLCHARS` searches :meth:`Workflow.filter`
+#: keeps for reuse
+SEARCH_CACHE_SIZE = 100
+
+#: Number of folded strings :func:`fold_to_ascii` keeps for reuse
+FOLD_CACHE_SIZE = 10000
+
+#: :class:`FilterIndex` objects with at least this many items are
+#: pre-filtered with NumPy if it is installed
+NUMPY_MIN_ITEMS = 20000
+
+#: :meth:`Workflow.filter` only uses worker processes for at least this
+#: many items (after any NumPy pre-filtering). See its ``parallel``
+#: argument
+PARALLEL_MIN_ITEMS = 50000
+
+# Bits of ASCII characters in character masks. Lowercase letters and
+# digits get a bit each, other characters share the next 20
+_CHAR_BITS = dict((unichr(i), 1 << (36 + i % 20)) for i in range(128))
+_CHAR_BITS.update((c, 1 << i) for i, c in
+                  enumerate(string.ascii_lowercase + string.digits))
+
 
 ####################################################################
 # Used by `Workflow.check_update`
@@ -499,6 +526,150 @@ def isascii(text):
     return True
 
 
+# Folded non-ASCII strings. Cleared when it reaches `FOLD_CACHE_SIZE`
+_fold_cache = {}
+
+
+def fold_to_ascii(text):
+    """Convert non-ASCII characters to closest ASCII equivalent.
+
+    See :meth:`Workflow.fold_to_ascii`.
+
+    :param text: text to convert
+    :type text: ``unicode``
+    :returns: text containing only ASCII characters
+    :rtype: ``unicode``
+
+    """
+    if isascii(text):
+        return text
+
+    folded = _fold_cache.get(text)
+    if folded is None:
+        folded = text.translate(_ASCII_TRANSLATIONS)
+        if not isascii(folded):
+            folded = unicode(unicodedata.normalize('NFKD',
+                             folded).encode('ascii', 'ignore'))
+        if len(_fold_cache) >= FOLD_CACHE_SIZE:
+            _fold_cache.clear()
+        _fold_cache[text] = folded
+    return folded
+
+
+def _search_features(value, mask=True):
+    """Return features of search key ``value`` used by the ``MATCH_*`` rules.
+
+    :param mask: whether to compute the character mask, which only
+        :meth:`_CompiledQuery.accepts` uses
+    :returns: ``(value, lowercase value, mask of lowercase characters
+        or ``None``, lowercase capitals, atoms, initials of atoms)``
+    :rtype: ``tuple``
+
+    """
+    lower = value.lower()
+    # split the item into "atoms", i.e. words separated by
+    # spaces or other non-word characters
+    atoms = [s.lower() for s in split_on_delimiters(value)]
+    return (value, lower, _char_mask(lower) if mask else None,
+            ''.join([c for c in value if c in INITIALS]).lower(),
+            atoms, ''.join([s[0] for s in atoms if s]))
+
+
+def _char_mask(text):
+    """Return bitmask of the characters in ``text``.
+
+    Each character sets one of 64 bits (see :data:`_CHAR_BITS`).
+    Non-ASCII characters share the top 8 bits. If a text contains all
+    the characters of another, its mask contains all the bits of the
+    other's mask, but not necessarily the other way round.
+
+    :param text: text to get mask of
+    :type text: ``unicode``
+    :rtype: ``int``
+
+    """
+    mask = 0
+    for c in set(text):
+        bit = _CHAR_BITS.get(c)
+        if bit is None:
+            bit = 1 << (56 + ord(c) % 8)
+        mask |= bit
+    return mask
+
+
+# :mod:`numpy` or ``None`` once :func:`_numpy` has tried to import it
+_numpy_module = UNSET
+
+
+def _numpy():
+    """Return :mod:`numpy` or ``None`` if it isn't installed.
+
+    NumPy is slow to import, so it is only imported when needed.
+
+    """
+    global _numpy_module
+    if _numpy_module is UNSET:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy_module = numpy
+    return _numpy_module
+
+
+def _rank(results, max_results, ascending):
+    """Rank results of :meth:`Workflow._filter_pairs`.
+
+    :param results: ``(sort key, result)`` tuples
+    :returns: best ``max_results`` (or all) ``results`` in order
+
+    """
+    # sort on keys. If only the best `max_results` are wanted, rank them
+    # with a bounded heap instead of sorting all results
+    if max_results and ascending:
+        return heapq.nlargest(max_results, results)
+    elif max_results:
+        return heapq.nsmallest(max_results, results)
+    return sorted(results, reverse=ascending)
+
+
+def _cpu_count():
+    """Return number of CPUs or ``1`` if it can't be determined."""
+    import multiprocessing
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+# Arguments of `Workflow._filter_parallel()` for `_filter_shard()`.
+# Inherited by the worker processes, so they needn't be picklable
+_parallel_filter = None
+
+
+def _filter_shard(bounds):
+    """Rank items ``start`` to ``end`` of parallel :meth:`Workflow.filter`.
+
+    Runs in a worker process.
+
+    :param bounds: ``(start, end)``
+    :returns: best ``(sort key, (position, score, rule))`` tuples.
+        Positions are returned instead of items, which may not be
+        picklable.
+
+    """
+    (wf, pairs, key, compiled, match_on, min_score, boost, max_results,
+     ascending) = _parallel_filter
+    start, end = bounds
+    pairs = pairs[start:end]
+    positions = dict((id(item), start + i)
+                     for i, (item, _) in enumerate(pairs))
+    results = _rank(wf._filter_pairs(pairs, key, compiled, match_on,
+                                     min_score, boost),
+                    max_results, ascending)
+    return [(k, (positions[id(t[0])],) + t[1:]) for k, t in results]
+
+
 ####################################################################
 # Implementation classes
 ####################################################################
@@ -706,6 +877,218 @@ manager.register('pickle', PickleSerializer)
 manager.register('json', JSONSerializer)
 
 
+class FilterIndex(object):
+    """Items with precomputed search features for :meth:`Workflow.filter`.
+
+    :meth:`Workflow.filter` lowercases, folds and splits every item's
+    search key for every query. Pass a :class:`FilterIndex` as its
+    ``items`` instead to do that only once per item. Matching and
+    scoring are exactly the same.
+
+    A :class:`FilterIndex` can be cached with the ``cpickle`` and
+    ``pickle`` serializers if its items can.
+
+    The features include a bitmask of the characters of each search key,
+    so :meth:`Workflow.filter` can reject most items that don't contain
+    all the characters of the query with a single ``&``. If NumPy is
+    installed, the masks of indices of :const:`NUMPY_MIN_ITEMS` or more
+    items are also held in an array, and such items are rejected in
+    bulk. The results are the same either way.
+
+    :param items: items to index
+    :param key: function to get search key from ``items``. See
+        :meth:`Workflow.filter`.
+
+    """
+
+    def __init__(self, items=(), key=lambda x: x):
+        """Create new :class:`FilterIndex` of ``items``."""
+        self.items = []
+        self.features = []
+        for item in items:
+            self.items.append(item)
+            self.features.append(self._features(key(item).strip()))
+
+    @staticmethod
+    def _features(value):
+        """Return ``(features, folded features)`` of search key ``value``.
+
+        :returns: features as returned by :func:`_search_features` or
+            ``None`` if ``value`` is empty
+
+        """
+        if not value:
+            return None
+        features = _search_features(value)
+        if not isascii(value):
+            return (features, _search_features(fold_to_ascii(value)))
+        return (features, features)
+
+    # `(masks, folded masks)` arrays. Built on demand by `_masks()`
+    _mask_arrays = None
+
+    def select(self, positions):
+        """Return new :class:`FilterIndex` of items at ``positions``.
+
+        Features and character masks are not recomputed.
+
+        :param positions: indices of items to select
+        :type positions: iterable of ``int``
+        :returns: index of selected items
+        :rtype: :class:`FilterIndex`
+
+        """
+        positions = list(positions)
+        index = FilterIndex()
+        index.items = [self.items[i] for i in positions]
+        index.features = [self.features[i] for i in positions]
+        masks = self._masks()
+        if masks is not None:
+            np = _numpy()
+            positions = np.array(positions, dtype=np.intp)
+            index._mask_arrays = (masks[0][positions], masks[1][positions])
+        return index
+
+    def _masks(self):
+        """Return ``(masks, folded masks)`` NumPy arrays or ``None``.
+
+        Items without a search key get all bits set.
+
+        """
+        if self._mask_arrays is not None:
+            return self._mask_arrays
+
+        if len(self.items) < NUMPY_MIN_ITEMS:
+            return None
+
+        np = _numpy()
+        if np is None:
+            return None
+
+        everything = 2 ** 64 - 1
+        self._mask_arrays = tuple(
+            np.array([f[variant][2] if f else everything
+                      for f in self.features], dtype=np.uint64)
+            for variant in (0, 1))
+        return self._mask_arrays
+
+    def _prefilter(self, compiled):
+        """Return positions of items that may match ``compiled`` or ``None``.
+
+        :param compiled: query to match
+        :type compiled: :class:`_CompiledQuery`
+        :returns: positions of items whose masks contain the query's
+            required characters or ``None`` if there are no masks
+        :rtype: ``list``
+
+        """
+        masks = self._masks()
+        if masks is None:
+            return None
+
+        np = _numpy()
+        keep = np.ones(len(self.items), dtype=bool)
+        for required, variant in ((compiled.required_mask, masks[0]),
+                                  (compiled.required_folded_mask, masks[1])):
+            if required:
+                required = np.uint64(required)
+                keep &= (variant & required) == required
+        return np.flatnonzero(keep).tolist()
+
+    def __getstate__(self):
+        """Pickle without NumPy arrays, which need NumPy to load."""
+        state = self.__dict__.copy()
+        state.pop('_mask_arrays', None)
+        return state
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class _CompiledQuery(object):
+    """Query for :meth:`Workflow.filter` prepared for matching many items.
+
+    Everything about the query that doesn't depend on the item is worked
+    out once: the query is split into lowercase words, each word's
+    folding mode and :const:`MATCH_ALLCHARS` search are determined, and
+    the characters every item must contain are collected.
+
+    :param query: stripped, non-empty query
+    :param match_on: ``MATCH_*`` rules
+    :param fold_diacritics: whether to fold search keys for ASCII words
+    :param search_for_query: function to get :const:`MATCH_ALLCHARS`
+        search for a word
+
+    """
+
+    def __init__(self, query, match_on, fold_diacritics, search_for_query):
+        #: ``(word, fold, search)`` tuples
+        self.words = []
+        #: characters search key must contain
+        self.required = set()
+        #: characters folded search key must contain
+        self.required_folded = set()
+        for word in query.split(' '):
+            word = word.strip().lower()
+            if not word:
+                continue
+            fold = bool(fold_diacritics) and isascii(word)
+            search = None
+            if match_on & MATCH_ALLCHARS:
+                search = search_for_query(word)
+            self.words.append((word, fold, search))
+            if fold:
+                self.required_folded.update(word)
+            else:
+                self.required.update(word)
+        #: masks of :attr:`required` and :attr:`required_folded`
+        self.required_mask = _char_mask(self.required)
+        self.required_folded_mask = _char_mask(self.required_folded)
+
+    def features(self, value):
+        """Return features of search key ``value`` or ``None``.
+
+        Only the features the words need are computed.
+
+        :param value: stripped, non-empty search key
+        :returns: ``(features, folded features)`` as for
+            :attr:`FilterIndex.features` or ``None`` if ``value`` does
+            not contain all required characters
+
+        """
+        raw = folded = None
+        # pre-filter any items that do not contain all characters
+        # of the query to save on running several more expensive tests
+        if self.required:
+            if not self.required <= set(value.lower()):
+                return None
+            raw = _search_features(value, mask=False)
+        if self.required_folded:
+            folded_value = fold_to_ascii(value)
+            if not self.required_folded <= set(folded_value.lower()):
+                return None
+            folded = _search_features(folded_value, mask=False)
+        return (raw, folded)
+
+    def accepts(self, features):
+        """Pre-filter :class:`FilterIndex` ``features``.
+
+        Compares character masks, not sets, so the test is cheap, but
+        can't reject all items that lack a required character.
+
+        :returns: ``False`` if search key doesn't contain all required
+            characters
+
+        """
+        required = self.required_mask
+        folded = self.required_folded_mask
+        return ((features[0][2] & required) == required and
+                (features[1][2] & folded) == folded)
+
+
 class Item(object):
     """Represents a feedback item for Alfred.
 
@@ -1161,8 +1544,8 @@ class Workflow(object):
         self._version = UNSET
         # Version from last workflow run
         self._last_version_run = UNSET
-        # Cache for regex patterns created for filter keys
-        self._search_pattern_cache = {}
+        # Cache for `MATCH_ALLCHARS` searches created for filter keys
+        self._search_pattern_cache = OrderedDict()
         # Magic arguments
         #: The prefix for all magic arguments. Default is ``workflow:``
         self.magic_prefix = 'workflow:'
@@ -1857,7 +2240,8 @@ class Workflow(object):
 
         self.logger.debug('saved data: %s', data_path)
 
-    def cached_data(self, name, data_func=None, max_age=60):
+    def cached_data(self, name, data_func=None, max_age=60,
+                    serializer=None):
         """Return cached data if younger than ``max_age`` seconds.
 
         Retrieve data from cache or re-generate and re-cache data if
@@ -1869,14 +2253,17 @@ class Workflow(object):
         :type data_func: ``callable``
         :param max_age: maximum age of cached data in seconds
         :type max_age: ``int``
+        :param serializer: name of serializer to use. If no serializer
+            is specified, :attr:`cache_serializer` is used.
         :returns: cached data, return value of ``data_func`` or ``None``
             if ``data_func`` is not set
 
         """
-        serializer = manager.serializer(self.cache_serializer)
+        serializer_name = serializer or self.cache_serializer
+        serializer = manager.serializer(serializer_name)
 
-        cache_path = self.cachefile('%s.%s' % (name, self.cache_serializer))
-        age = self.cached_data_age(name)
+        cache_path = self.cachefile('%s.%s' % (name, serializer_name))
+        age = self.cached_data_age(name, serializer_name)
 
         if (age < max_age or max_age == 0) and os.path.exists(cache_path):
 
@@ -1888,11 +2275,11 @@ class Workflow(object):
             return None
 
         data = data_func()
-        self.cache_data(name, data)
+        self.cache_data(name, data, serializer=serializer_name)
 
         return data
 
-    def cache_data(self, name, data):
+    def cache_data(self, name, data, serializer=None):
         """Save ``data`` to cache under ``name``.
 
         If ``data`` is ``None``, the corresponding cache file will be
@@ -1901,11 +2288,14 @@ class Workflow(object):
         :param name: name of datastore
         :param data: data to store. This may be any object supported by
                 the cache serializer
+        :param serializer: name of serializer to use. If no serializer
+            is specified, :attr:`cache_serializer` is used.
 
         """
-        serializer = manager.serializer(self.cache_serializer)
+        serializer_name = serializer or self.cache_serializer
+        serializer = manager.serializer(serializer_name)
 
-        cache_path = self.cachefile('%s.%s' % (name, self.cache_serializer))
+        cache_path = self.cachefile('%s.%s' % (name, serializer_name))
 
         if data is None:
             if os.path.exists(cache_path):
@@ -1918,33 +2308,38 @@ class Workflow(object):
 
         self.logger.debug('cached data: %s', cache_path)
 
-    def cached_data_fresh(self, name, max_age):
+    def cached_data_fresh(self, name, max_age, serializer=None):
         """Whether cache `name` is less than `max_age` seconds old.
 
         :param name: name of datastore
         :param max_age: maximum age of data in seconds
         :type max_age: ``int``
+        :param serializer: name of serializer the data were cached with.
+            If no serializer is specified, :attr:`cache_serializer` is used.
         :returns: ``True`` if data is less than ``max_age`` old, else
             ``False``
 
         """
-        age = self.cached_data_age(name)
+        age = self.cached_data_age(name, serializer)
 
         if not age:
             return False
 
         return age < max_age
 
-    def cached_data_age(self, name):
+    def cached_data_age(self, name, serializer=None):
         """Return age in seconds of cache `name` or 0 if cache doesn't exist.
 
         :param name: name of datastore
         :type name: ``unicode``
+        :param serializer: name of serializer the data were cached with.
+            If no serializer is specified, :attr:`cache_serializer` is used.
         :returns: age of datastore in seconds
         :rtype: ``int``
 
         """
-        cache_path = self.cachefile('%s.%s' % (name, self.cache_serializer))
+        serializer_name = serializer or self.cache_serializer
+        cache_path = self.cachefile('%s.%s' % (name, serializer_name))
 
         if not os.path.exists(cache_path):
             return 0
@@ -1953,7 +2348,8 @@ class Workflow(object):
 
     def filter(self, query, items, key=lambda x: x, ascending=False,
                include_score=False, min_score=0, max_results=0,
-               match_on=MATCH_ALL, fold_diacritics=True):
+               match_on=MATCH_ALL, fold_diacritics=True, parallel=False,
+               boost=None):
         """Fuzzy search filter. Returns list of ``items`` that match ``query``.
 
         ``query`` is case-insensitive. Any item that does not contain the
@@ -1965,7 +2361,7 @@ class Workflow(object):
         :param query: query to test items against
         :type query: ``unicode``
         :param items: iterable of items to test
-        :type items: ``list`` or ``tuple``
+        :type items: ``list``, ``tuple`` or :class:`FilterIndex`
         :param key: function to get comparison key from ``items``.
             Must return a ``unicode`` string. The default simply returns
             the item.
@@ -1980,6 +2376,8 @@ class Workflow(object):
             than this.
         :type min_score: ``int``
         :param max_results: If non-zero, prune results list to this length.
+            Only the best ``max_results`` items are ranked, so this is
+            much faster than slicing the results of a large list.
         :type max_results: ``int``
         :param match_on: Filter option flags. Bitwise-combined list of
             ``MATCH_*`` constants (see below).
@@ -1987,6 +2385,17 @@ class Workflow(object):
         :param fold_diacritics: Convert search keys to ASCII-only
             characters if ``query`` only contains ASCII characters.
         :type fold_diacritics: ``Boolean``
+        :param parallel: Number of processes to match ``items`` in or
+            ``True`` for one per CPU. Only used if there are at least
+            :const:`PARALLEL_MIN_ITEMS` items, as starting the processes
+            takes longer than matching fewer items.
+        :type parallel: ``int`` or ``Boolean``
+        :param boost: function called with an item and its match score
+            to get a static score for the item, e.g. from its popularity
+            or age. It is added to the match score when ranking results,
+            so items that match equally well are ordered by it. The
+            returned scores do not include it.
+        :type boost: ``callable``
         :returns: list of ``items`` matching ``query`` or list of
             ``(item, score, rule)`` `tuples` if ``include_score`` is ``True``.
             ``rule`` is the ``MATCH_*`` rule that matched the item.
@@ -2052,108 +2461,170 @@ class Workflow(object):
         altered.
 
         """
+        if isinstance(items, FilterIndex):
+            all_items = items.items
+        else:
+            all_items = items
+
         if not query:
-            return items
+            return all_items
 
         # Remove preceding/trailing spaces
         query = query.strip()
 
         if not query:
-            return items
+            return all_items
 
         # Use user override if there is one
         fold_diacritics = self.settings.get('__workflow_diacritic_folding',
                                             fold_diacritics)
 
-        results = []
+        # work out everything that doesn't depend on the item only once
+        compiled = _CompiledQuery(query, match_on, fold_diacritics,
+                                  self._search_for_query)
+
+        if isinstance(items, FilterIndex):
+            positions = items._prefilter(compiled)
+            if positions is None:
+                positions = xrange(len(items.items))
+            # Items with empty search keys have no features and can't
+            # match. Leave them out: `key` doesn't apply to index items
+            features = items.features
+            pairs = [(items.items[i], features[i]) for i in positions
+                     if features[i] is not None]
+        elif parallel:
+            pairs = [(item, None) for item in items]
+        else:
+            pairs = ((item, None) for item in items)
+
+        if parallel is True:
+            parallel = _cpu_count()
+        if parallel > 1 and len(pairs) >= PARALLEL_MIN_ITEMS:
+            results = self._filter_parallel(parallel, pairs, key, compiled,
+                                            match_on, min_score, boost,
+                                            max_results, ascending)
+        else:
+            results = _rank(self._filter_pairs(pairs, key, compiled,
+                                               match_on, min_score, boost),
+                            max_results, ascending)
+        results = [t[1] for t in results]
 
-        for item in items:
-            skip = False
-            score = 0
-            words = [s.strip() for s in query.split(' ')]
-            value = key(item).strip()
-            if value == '':
-                continue
-            for word in words:
-                if word == '':
+        # return list of ``(item, score, rule)``
+        if include_score:
+            return results
+        # just return list of items
+        return [t[0] for t in results]
+
+    def _filter_pairs(self, pairs, key, compiled, match_on, min_score,
+                      boost=None):
+        """Match ``(item, features)`` ``pairs`` against ``compiled`` query.
+
+        ``features`` are from a :class:`FilterIndex` or ``None`` to get
+        them from ``key``. ``boost`` is as for :meth:`filter`.
+
+        :returns: generator of ``(sort key, (item, score, rule))`` tuples
+            for items that match
+
+        """
+        words = compiled.words
+        accepts = compiled.accepts
+
+        for item, features in pairs:
+            if features is not None:
+                if not accepts(features):
                     continue
-                s, rule = self._filter_item(value, word, match_on,
-                                            fold_diacritics)
+                value = features[0][0]
+            else:
+                value = key(item).strip()
+                if value == '':
+                    continue
+                features = compiled.features(value)
+                if features is None:
+                    continue
+
+            score = 0
+            for word, fold, search in words:
+                s, rule = self._match_features(
+                    features[1] if fold else features[0], word,
+                    match_on, search)
 
                 if not s:  # Skip items that don't match part of the query
-                    skip = True
+                    break
                 score += s
 
-            if skip:
+            if not s:
                 continue
 
-            if score:
-                # use "reversed" `score` (i.e. highest becomes lowest) and
-                # `value` as sort key. This means items with the same score
-                # will be sorted in alphabetical not reverse alphabetical order
-                results.append(((100.0 / score, value.lower(), score),
-                                (item, score, rule)))
-
-        # sort on keys, then discard the keys
-        results.sort(reverse=ascending)
-        results = [t[1] for t in results]
-
-        if min_score:
-            results = [r for r in results if r[1] > min_score]
+            if score and (not min_score or score > min_score):
+                # use "reversed" `score` (i.e. highest becomes lowest)
+                # and `value` as sort key. This means items with the
+                # same score will be sorted in alphabetical not reverse
+                # alphabetical order
+                if boost is None:
+                    rank = 100.0 / score
+                else:
+                    rank = -(score + boost(item, score))
+                yield ((rank, value.lower(), score), (item, score, rule))
 
-        if max_results and len(results) > max_results:
-            results = results[:max_results]
+    def _filter_parallel(self, processes, pairs, key, compiled, match_on,
+                         min_score, boost, max_results, ascending):
+        """Match ``pairs`` in ``processes`` worker processes.
 
-        # return list of ``(item, score, rule)``
-        if include_score:
-            return results
-        # just return list of items
-        return [t[0] for t in results]
+        Each worker ranks its share of ``pairs`` like :meth:`filter`
+        would and returns its best ``max_results``. These are merged
+        into the overall best ``max_results``.
 
-    def _filter_item(self, value, query, match_on, fold_diacritics):
-        """Filter ``value`` against ``query`` using rules ``match_on``.
+        The workers are forked, so neither ``items`` nor ``key`` need be
+        picklable.
 
-        :returns: ``(score, rule)``
+        :returns: ranked ``(sort key, (item, score, rule))`` tuples
 
         """
-        query = query.lower()
+        from multiprocessing import Pool
+        global _parallel_filter
+
+        size = -(-len(pairs) // processes)
+        shards = [(i, i + size) for i in range(0, len(pairs), size)]
+        log = self.logger
+        log.debug('filtering %d items in %d processes', len(pairs),
+                  len(shards))
+
+        _parallel_filter = (self, pairs, key, compiled, match_on, min_score,
+                            boost, max_results, ascending)
+        pool = Pool(len(shards))
+        try:
+            results = pool.map(_filter_shard, shards)
+        finally:
+            pool.terminate()
+            _parallel_filter = None
 
-        if not isascii(query):
-            fold_diacritics = False
+        results = [(k, (pairs[t[0]][0],) + t[1:])
+                   for shard in results for k, t in shard]
+        return _rank(results, max_results, ascending)
 
-        if fold_diacritics:
-            value = self.fold_to_ascii(value)
+    def _match_features(self, features, query, match_on, search=None):
+        """Match search key ``features`` against lowercase ``query``.
 
-        # pre-filter any items that do not contain all characters
-        # of ``query`` to save on running several more expensive tests
-        if not set(query) <= set(value.lower()):
+        :param features: tuple returned by :func:`_search_features`
+        :param search: :const:`MATCH_ALLCHARS` search for ``query``.
+            Looked up if not given.
+        :returns: ``(score, rule)``
 
-            return (0, None)
+        """
+        value, lower, _, capitals, atoms, initials = features
 
         # item starts with query
-        if match_on & MATCH_STARTSWITH and value.lower().startswith(query):
+        if match_on & MATCH_STARTSWITH and lower.startswith(query):
             score = 100.0 - (len(value) / len(query))
 
             return (score, MATCH_STARTSWITH)
 
         # query matches capitalised letters in item,
         # e.g. of = OmniFocus
-        if match_on & MATCH_CAPITALS:
-            initials = ''.join([c for c in value if c in INITIALS])
-            if initials.lower().startswith(query):
-                score = 100.0 - (len(initials) / len(query))
-
-                return (score, MATCH_CAPITALS)
-
-        # split the item into "atoms", i.e. words separated by
-        # spaces or other non-word characters
-        if (match_on & MATCH_ATOM or
-                match_on & MATCH_INITIALS_CONTAIN or
-                match_on & MATCH_INITIALS_STARTSWITH):
-            atoms = [s.lower() for s in split_on_delimiters(value)]
-            # print('atoms : %s  -->  %s' % (value, atoms))
-            # initials of the atoms
-            initials = ''.join([s[0] for s in atoms if s])
+        if match_on & MATCH_CAPITALS and capitals.startswith(query):
+            score = 100.0 - (len(capitals) / len(query))
+
+            return (score, MATCH_CAPITALS)
 
         if match_on & MATCH_ATOM:
             # is `query` one of the atoms in item?
@@ -2183,7 +2654,7 @@ class Workflow(object):
             return (score, MATCH_INITIALS_CONTAIN)
 
         # `query` is a substring of item
-        if match_on & MATCH_SUBSTRING and query in value.lower():
+        if match_on & MATCH_SUBSTRING and query in lower:
             score = 90.0 - (len(value) / len(query))
 
             return (score, MATCH_SUBSTRING)
@@ -2191,11 +2662,12 @@ class Workflow(object):
         # finally, assign a score based on how close together the
         # characters in `query` are in item.
         if match_on & MATCH_ALLCHARS:
-            search = self._search_for_query(query)
-            match = search(value)
-            if match:
-                score = 100.0 / ((1 + match.start()) *
-                                 (match.end() - match.start() + 1))
+            if search is None:
+                search = self._search_for_query(query)
+            end = search(lower)
+            if end:
+                # matches always start at the beginning of the item
+                score = 100.0 / (end + 1)
 
                 return (score, MATCH_ALLCHARS)
 
@@ -2203,18 +2675,31 @@ class Workflow(object):
         return (0, None)
 
     def _search_for_query(self, query):
-        if query in self._search_pattern_cache:
-            return self._search_pattern_cache[query]
-
-        # Build pattern: include all characters
-        pattern = []
-        for c in query:
-            # pattern.append('[^{0}]*{0}'.format(re.escape(c)))
-            pattern.append('.*?{0}'.format(re.escape(c)))
-        pattern = ''.join(pattern)
-        search = re.compile(pattern, re.IGNORECASE).search
-
-        self._search_pattern_cache[query] = search
+        """Return :const:`MATCH_ALLCHARS` search for lowercase ``query``.
+
+        The search takes a lowercase search key and returns the end of
+        its shortest prefix that contains all the characters of ``query``
+        in order, or ``0`` if it doesn't contain them. It takes each
+        character at its first occurrence after the previous one, so it
+        runs in linear time and never backtracks.
+
+        The last :const:`SEARCH_CACHE_SIZE` searches are kept.
+
+        """
+        cache = self._search_pattern_cache
+        search = cache.pop(query, None)
+        if search is None:
+            def search(text):
+                end = 0
+                for c in query:
+                    end = text.find(c, end) + 1
+                    if not end:
+                        break
+                return end
+
+        cache[query] = search
+        if len(cache) > SEARCH_CACHE_SIZE:
+            cache.popitem(last=False)
         return search
 
     def run(self, func, text_errors=False):
@@ -2903,11 +3388,7 @@ class Workflow(object):
         :rtype: ``unicode``
 
         """
-        if isascii(text):
-            return text
-        text = ''.join([ASCII_REPLACEMENTS.get(c, c) for c in text])
-        return unicode(unicodedata.normalize('NFKD',
-                       text).encode('ascii', 'ignore'))
+        return fold_to_ascii(text)
 
     def dumbify_punctuation(self, text):
         """Convert non-ASCII punctuation to closest ASCII equivalent.
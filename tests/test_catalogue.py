@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2014 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2026-10-17
+#
+
+"""Tests for the memory-mapped workflow `Catalogue`.
+
+Run with ``python -m unittest discover tests`` from the repository root.
+"""
+
+from __future__ import print_function, unicode_literals
+
+from datetime import datetime
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src'))
+
+from catalogue import Catalogue, pack_catalogue  # noqa: E402
+from common import Version  # noqa: E402
+
+
+WORKFLOWS = [
+    {'name': 'Crème Brûlée', 'tags': ['food', 'dessert'], 'status': 1,
+     'updated': datetime(2016, 5, 1), 'version': Version('1.2'),
+     'static_score': 0.5},
+    {'name': 'Timer', 'tags': [], 'status': 2, 'updated': None,
+     'version': None, 'static_score': 0.25},
+]
+
+
+class CatalogueTests(unittest.TestCase):
+
+    def test_round_trip(self):
+        """Catalogue returns packed values"""
+        catalogue = Catalogue(pack_catalogue(WORKFLOWS, 'abc123'))
+        self.assertEqual(catalogue.build, 'abc123')
+        self.assertEqual(len(catalogue), 2)
+        self.assertEqual(catalogue[0]['name'], 'Crème Brûlée')
+        self.assertEqual(catalogue[0]['tags'], ['food', 'dessert'])
+        self.assertEqual(catalogue[1]['updated'], None)
+        self.assertEqual(catalogue.column('status'), [1, 2])
+
+    def test_truncated(self):
+        """Truncated catalogues raise ValueError"""
+        data = pack_catalogue(WORKFLOWS)
+        for size in xrange(len(data)):
+            with self.assertRaises(ValueError):
+                Catalogue(data[:size])
+
+
+if __name__ == '__main__':
+    unittest.main()
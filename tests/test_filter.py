@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2014 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2026-10-17
+#
+
+"""Tests for `Workflow.filter`, with and without a `FilterIndex`.
+
+Run with ``python -m unittest discover tests`` from the repository root.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src'))
+
+from workflow import FilterIndex, Workflow  # noqa: E402
+
+
+class FilterIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.env = os.environ.copy()
+        os.environ.update({
+            'alfred_workflow_bundleid': 'net.deanishe.test',
+            'alfred_workflow_cache': os.path.join(self.tempdir, 'cache'),
+            'alfred_workflow_data': os.path.join(self.tempdir, 'data'),
+            'alfred_version': '3.0',
+        })
+        self.wf = Workflow()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.env)
+        shutil.rmtree(self.tempdir)
+
+    def test_empty_key_folded_query(self):
+        """Items with empty search keys are skipped, not passed to `key`"""
+        keys = ['Crème Brûlée', '', 'Über Straße', '  ']
+        index = FilterIndex(range(len(keys)), key=lambda i: keys[i])
+        for query in ('crème', 'über', 'creme', 'e'):
+            self.assertEqual(
+                self.wf.filter(query, index),
+                self.wf.filter(query, range(len(keys)),
+                               key=lambda i: keys[i]))
+
+        self.assertEqual(self.wf.filter('crème', index), [0])
+
+    def test_boost_gets_score(self):
+        """`boost` can leave matches that will be cut unboosted"""
+        # 40 keys score 33 for "o", 30 keys score 25 and are popular
+        keys = (['x' * 53 + 'y%02do' % i for i in range(40)] +
+                ['x' * 61 + 'y%02do' % i for i in range(30)])
+        static = [0] * 40 + [1] * 30
+        calls = []
+
+        def boost(i, score):
+            calls.append((i, score))
+            return 10 * static[i] if score > 30 else 0
+
+        results = self.wf.filter('o', range(len(keys)), key=keys.__getitem__,
+                                 include_score=True, max_results=51,
+                                 boost=boost)
+        self.assertIn((0, 33.0), calls)
+        self.assertIn((40, 25.0), calls)
+        self.assertEqual(sorted([t[0] for t in results if t[1] > 30]),
+                         range(40))
+
+
+if __name__ == '__main__':
+    unittest.main()
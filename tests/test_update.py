@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2014 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2026-10-17
+#
+
+"""Tests for the conditional manifest download in `update_workflows`.
+
+A local HTTP server stands in for Packal. It answers 200 with an ETag
+and 304 to a request with a matching If-None-Match.
+
+Run with ``python -m unittest discover tests`` from the repository root.
+"""
+
+from __future__ import print_function, unicode_literals
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src'))
+
+from workflow import Workflow  # noqa: E402
+
+from catalogue import CATALOGUE_NAME, CATALOGUE_SERIALIZER  # noqa: E402
+from common import MANIFEST_NAME  # noqa: E402
+import update_workflows  # noqa: E402
+
+
+MANIFEST = """<?xml version="1.0" encoding="utf-8"?>
+<manifest>
+  <workflow>
+    <name>Crème Brûlée</name>
+    <bundle>net.example.creme</bundle>
+    <author>Dean Jackson</author>
+    <version>1.2</version>
+    <updated>1400000000</updated>
+    <tags>food|||dessert</tags>
+    <categories>Tools</categories>
+    <osx>10.10|||10.11</osx>
+    <url>http://www.packal.org/workflow/creme</url>
+    <short>Makes dessert</short>
+    <description>Burns the sugar</description>
+  </workflow>
+  <workflow>
+    <name>Timer</name>
+    <bundle>net.example.timer</bundle>
+    <author>Shawn Rice</author>
+    <version>2.0</version>
+    <updated>1450000000</updated>
+    <tags></tags>
+    <categories>Productivity</categories>
+    <osx></osx>
+    <url>http://www.packal.org/workflow/timer</url>
+    <short>Counts down</short>
+    <description>Rings a bell</description>
+  </workflow>
+</manifest>
+""".encode('utf-8')
+
+ETAG = b'"manifest-1"'
+
+
+class ManifestHandler(BaseHTTPRequestHandler):
+    """Serve :data:`MANIFEST` and record the requests' validators"""
+
+    #: ``If-None-Match`` header of each request
+    requests = []
+
+    def do_GET(self):
+        etag = self.headers.get('If-None-Match')
+        self.requests.append(etag)
+        if etag == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(MANIFEST)))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+        self.wfile.write(MANIFEST)
+
+    def log_message(self, *args):
+        pass
+
+
+class UpdateManifestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.env = os.environ.copy()
+        for key in ('http_proxy', 'HTTP_PROXY', 'all_proxy', 'ALL_PROXY'):
+            os.environ.pop(key, None)
+        os.environ.update({
+            'alfred_workflow_bundleid': 'net.deanishe.test',
+            'alfred_workflow_cache': os.path.join(self.tempdir, 'cache'),
+            'alfred_workflow_data': os.path.join(self.tempdir, 'data'),
+            'alfred_version': '3.0',
+        })
+        self.wf = Workflow()
+
+        ManifestHandler.requests = []
+        self.server = HTTPServer(('127.0.0.1', 0), ManifestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.saved = (update_workflows.MANIFEST_URL,
+                      update_workflows.get_installed_workflows,
+                      update_workflows.log, sys.argv)
+        update_workflows.MANIFEST_URL = 'http://127.0.0.1:{}/manifest.xml'\
+            .format(self.server.server_port)
+        # Alfred's workflow directory doesn't exist here
+        update_workflows.get_installed_workflows = \
+            lambda scans=None: ({}, {})
+        update_workflows.log = self.wf.logger
+
+    def tearDown(self):
+        (update_workflows.MANIFEST_URL,
+         update_workflows.get_installed_workflows,
+         update_workflows.log, sys.argv) = self.saved
+        self.server.shutdown()
+        self.server.server_close()
+        os.environ.clear()
+        os.environ.update(self.env)
+        shutil.rmtree(self.tempdir)
+
+    def update(self, *args):
+        """Run `update_workflows.py` with ``args``"""
+        sys.argv = ['update_workflows.py'] + list(args)
+        update_workflows.main(self.wf)
+
+    def expire(self, name):
+        """Make data cached under ``name`` an hour old"""
+        path = self.wf.cachefile('{}.{}'.format(name,
+                                                self.wf.cache_serializer))
+        then = time.time() - 3600
+        os.utime(path, (then, then))
+
+    def catalogue(self):
+        return self.wf.cached_data(CATALOGUE_NAME, None, max_age=0,
+                                   serializer=CATALOGUE_SERIALIZER)
+
+    def test_conditional_download(self):
+        """Manifest is parsed, then only revalidated, then forced"""
+        self.update()
+        self.assertEqual(ManifestHandler.requests, [None])
+        manifest = self.wf.cached_data(MANIFEST_NAME, None, max_age=0)
+        self.assertEqual([w['name'] for w in manifest],
+                         ['Crème Brûlée', 'Timer'])
+        self.assertEqual(manifest[0]['tags'], ['food', 'dessert'])
+        self.assertEqual(manifest[1]['version'].version_string, '2.0')
+        build = self.catalogue().build
+
+        # Stale manifest: 304, so the cache is touched, not rebuilt
+        self.expire(MANIFEST_NAME)
+        self.update()
+        self.assertEqual(ManifestHandler.requests, [None, ETAG])
+        self.assertTrue(self.wf.cached_data_fresh(
+            MANIFEST_NAME, update_workflows.CACHE_MAXAGE))
+        self.assertEqual(self.catalogue().build, build)
+
+        # Forced update sends no validators and rebuilds the catalogue
+        self.update('--force-update')
+        self.assertEqual(ManifestHandler.requests, [None, ETAG, None])
+        catalogue = self.catalogue()
+        self.assertNotEqual(catalogue.build, build)
+        self.assertEqual(len(catalogue), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()